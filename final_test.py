@@ -5,12 +5,14 @@ LEGO Scraper Final Test - Tests if the scraper can extract complete product info
 
 import os
 import json
+import functools
 import logging
-from bs4 import BeautifulSoup
+import orjson
 from playwright.sync_api import sync_playwright
 import sys
 import time
 import re
+from request_blocking import request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +29,24 @@ logger = logging.getLogger(__name__)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Fallback for a set number that is not at the start of the alt text
+_PRODUCT_ID_RE = re.compile(r'(\d{5})')
+
+@functools.lru_cache(maxsize=32)
+def _alt_re(category_name):
+    """Compile the alt-text pattern for a category, once per category.
+    
+    Alt text looks like "21058 LEGO® Architecture Keops Piramidi - Architecture";
+    a single match captures the set number, the bare name and drops the suffix.
+    """
+    return re.compile(
+        rf'^(?:(?P<id>\d{{5}})\s+LEGO®\s+)?(?P<name>.*?)(?:\s+-\s+{re.escape(category_name)})?$',
+        re.DOTALL
+    )
+
+# Stylesheets are kept since visibility waits and lazy loading depend on layout
+block_unneeded_requests = request_blocker()
+
 # Load configuration
 def load_config():
     try:
@@ -45,28 +65,42 @@ def load_config():
             "max_pages": 1
         }
 
-def extract_product_id(alt_text):
-    """Extract product ID from alt text using regex."""
+def parse_alt(alt_text, category_name):
+    """Extract product ID and name from alt text in a single regex pass."""
     if not alt_text:
-        return "Unknown"
+        return "Unknown", "Unknown"
     
-    # Look for patterns like "21058" or "21058 LEGO® Architecture"
-    match = re.search(r'(\d{5})', alt_text)
-    if match:
-        return match.group(1)
-    return "Unknown"
-
-def extract_product_name(alt_text):
-    """Extract product name from alt text."""
-    if not alt_text:
-        return "Unknown"
+    match = _alt_re(category_name).match(alt_text)
+    product_id = match.group('id')
+    if not product_id:
+        # The set number is not in the usual prefix position, look anywhere
+        id_match = _PRODUCT_ID_RE.search(alt_text)
+        product_id = id_match.group(1) if id_match else "Unknown"
     
-    # Remove the ID and LEGO® prefix
-    name = re.sub(r'^\d{5}\s+LEGO®\s+', '', alt_text)
-    # Remove the category suffix if present
-    name = re.sub(r'\s+-\s+Architecture$', '', name)
-    
-    return name
+    return product_id, match.group('name')
+
+# Runs in the page: reads the fields of the first `limit` product elements so
+# the whole extraction costs a single call into the browser
+_EXTRACT_PRODUCTS_JS = """
+(elements, [selectors, limit]) => {
+    const attr = (el, selector, name) => {
+        const found = el.querySelector(selector);
+        return found && found.hasAttribute(name) ? found.getAttribute(name) : null;
+    };
+    return {
+        count: elements.length,
+        products: elements.slice(0, limit).map(el => {
+            const priceElem = el.querySelector(selectors.price);
+            return {
+                alt: attr(el, selectors.name, 'alt'),
+                price: priceElem ? priceElem.textContent : null,
+                image_url: attr(el, selectors.image, 'src'),
+                product_url: attr(el, selectors.link, 'href')
+            };
+        })
+    };
+}
+"""
 
 def scrape_lego_products():
     """Test the scraper's ability to extract LEGO products."""
@@ -78,58 +112,50 @@ def scrape_lego_products():
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        page.route("**/*", block_unneeded_requests)
         
         try:
             logger.info(f"Navigating to {category['url']}")
-            page.goto(category['url'], wait_until="networkidle", timeout=60000)
+            page.goto(category['url'], wait_until="domcontentloaded", timeout=30000)
             
-            # Wait for any dynamic content to load
-            page.wait_for_timeout(5000)
+            # Wait for the product grid itself rather than for the network to go idle
+            product_selector = config.get("product_selector", ".product-item")
+            try:
+                page.locator(product_selector).first.wait_for(state="visible", timeout=15000)
+            except Exception as e:
+                logger.warning(f"Timeout waiting for product elements: {e}")
             
             # Get page title
             title = page.title()
             logger.info(f"Page title: {title}")
             
-            # Get page content
-            content = page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Extract product elements
-            product_selector = config.get("product_selector", ".product-item")
-            products = soup.select(product_selector)
+            # Extract product fields inside the browser, all in one round-trip
+            selectors = {
+                "name": config.get("name_selector", "img[alt]"),
+                "price": config.get("price_selector", ".product-price"),
+                "image": config.get("image_selector", ".lazyloaded"),
+                "link": "a"
+            }
+            result = page.eval_on_selector_all(product_selector, _EXTRACT_PRODUCTS_JS, [selectors, 5])
             
-            logger.info(f"Found {len(products)} products on the page")
+            logger.info(f"Found {result['count']} products on the page")
             
             # Extract product details
             extracted_products = []
-            for i, product in enumerate(products[:5]):  # Get first 5 products
+            for i, product in enumerate(result["products"]):  # First 5 products
                 try:
-                    # Extract product image which contains alt text with name and ID
-                    name_selector = config.get("name_selector", "img[alt]")
-                    img_elem = product.select_one(name_selector)
-                    
-                    if img_elem and 'alt' in img_elem.attrs:
-                        alt_text = img_elem['alt']
-                        product_id = extract_product_id(alt_text)
-                        name = extract_product_name(alt_text)
+                    # Product image alt text contains name and ID
+                    alt_text = product["alt"]
+                    if alt_text is not None:
+                        product_id, name = parse_alt(alt_text, category["name"])
                     else:
                         alt_text = "Unknown"
                         product_id = "Unknown"
                         name = "Unknown"
                     
-                    # Extract price
-                    price_selector = config.get("price_selector", ".product-price")
-                    price_elem = product.select_one(price_selector)
-                    price = price_elem.text.strip() if price_elem else "Unknown"
-                    
-                    # Extract image URL
-                    image_selector = config.get("image_selector", ".lazyloaded")
-                    image_elem = product.select_one(image_selector)
-                    image_url = image_elem['src'] if image_elem and 'src' in image_elem.attrs else "Unknown"
-                    
-                    # Extract product URL
-                    link_elem = product.select_one('a')
-                    product_url = link_elem['href'] if link_elem and 'href' in link_elem.attrs else "Unknown"
+                    price = product["price"].strip() if product["price"] is not None else "Unknown"
+                    image_url = product["image_url"] if product["image_url"] is not None else "Unknown"
+                    product_url = product["product_url"] if product["product_url"] is not None else "Unknown"
                     
                     # Create product data
                     product_data = {
@@ -146,22 +172,18 @@ def scrape_lego_products():
                     logger.info(f"Product {i+1}: {name} - {price} - {product_id}")
                     
                 except Exception as e:
-                    logger.error(f"Error extracting product data: {str(e)}")
-                    import traceback
-                    logger.error(traceback.format_exc())
+                    logger.exception("Error extracting product data: %s", e)
             
             # Save extracted products to file
             if extracted_products:
-                with open('data/final_extracted_products.json', 'w', encoding='utf-8') as f:
-                    json.dump(extracted_products, f, indent=2, ensure_ascii=False)
+                with open('data/final_extracted_products.json', 'wb') as f:
+                    f.write(orjson.dumps(extracted_products, option=orjson.OPT_INDENT_2))
                 logger.info(f"Saved {len(extracted_products)} products to data/final_extracted_products.json")
             
             return extracted_products
             
         except Exception as e:
-            logger.error(f"Error during scraping: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error during scraping: %s", e)
             return []
         finally:
             browser.close()
@@ -1,14 +1,20 @@
 import os
-import json
+import copy
+import functools
+import gzip
 import logging
+import mmap
+import orjson
 from datetime import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import schedule
 from crewai import Agent, Crew, Task, Process
 from langchain_ollama import OllamaLLM  # Corrected import
 
 # Import our tools
-from tools.lego_scraper_tools import LegoWebNavigationTool, LegoDataExtractionTool
+from tools.lego_scraper_tools import LegoWebNavigationTool, LegoDataExtractionTool, close_browser
 from tools.parser_tools import DataNormalizationTool, SchemaDetectionTool
 from tools.analyzer_tools import PriceComparisonTool, ChangeDetectionTool
 
@@ -27,12 +33,19 @@ logger = logging.getLogger(__name__)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Parse config.json; cached on its modification time so the file is only
+# re-read after it has been edited. The cached dict is shared, so callers only
+# ever get copies of it
+@functools.lru_cache(maxsize=1)
+def _read_config(mtime):
+    logger.info("Loading configuration...")
+    with open('config.json', 'rb') as f:
+        return orjson.loads(f.read())
+
 # Load configuration
 def load_config():
-    print("Loading configuration...")
     try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
+        return copy.deepcopy(_read_config(os.path.getmtime('config.json')))
     except FileNotFoundError:
         logger.warning("Config file not found, using defaults")
         return {
@@ -67,30 +80,52 @@ def initialize_llm(config):
     
     return OllamaLLM(base_url=ollama_base_url, model=ollama_model)
 
+# Write data as gzip-compressed JSON, replacing the target file atomically
+def write_json_gz(data, filename):
+    tmp_filename = filename + '.tmp'
+    with gzip.open(tmp_filename, 'wb') as f:
+        f.write(orjson.dumps(data))
+    os.replace(tmp_filename, filename)
+
+# Parse a historical data file; cached on (path, mtime) so repeated loads in the
+# same process skip decoding until the file is rewritten. The cached data is
+# shared, so callers only ever get copies of it
+@functools.lru_cache(maxsize=32)
+def _read_historical_file(path, mtime):
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    # Uncompressed files are parsed straight from the page cache, without
+    # first copying them into a bytes object
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            return orjson.loads(view)
+
 # Load historical data for a specific category
 def load_historical_data(category_name):
     filename = f'data/lego_{category_name.lower().replace(" ", "_")}_historical.json'
-    try:
-        with open(filename, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.info(f"No historical data found for {category_name}, will create new dataset")
-        return {"products": []}
+    # Prefer compressed data, fall back to uncompressed data written by older versions
+    for path in (filename + '.gz', filename):
+        try:
+            return copy.deepcopy(_read_historical_file(path, os.path.getmtime(path)))
+        except FileNotFoundError:
+            continue
+    
+    logger.info(f"No historical data found for {category_name}, will create new dataset")
+    return {"products": []}
 
 # Save data as historical for a specific category
 def save_historical_data(data, category_name):
-    filename = f'data/lego_{category_name.lower().replace(" ", "_")}_historical.json'
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    filename = f'data/lego_{category_name.lower().replace(" ", "_")}_historical.json.gz'
+    write_json_gz(data, filename)
     logger.info(f"Saved historical data for {category_name} with {len(data.get('products', []))} products")
 
 # Save analysis results for a specific category
 def save_analysis_results(analysis_data, category_name):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"data/lego_{category_name.lower().replace(' ', '_')}_analysis_{timestamp}.json"
+    filename = f"data/lego_{category_name.lower().replace(' ', '_')}_analysis_{timestamp}.json.gz"
     
-    with open(filename, 'w') as f:
-        json.dump(analysis_data, f, indent=2)
+    write_json_gz(analysis_data, filename)
     logger.info(f"Saved LEGO {category_name} analysis results to {filename}")
 
 # Initialize AI agents
@@ -240,35 +275,76 @@ def process_lego_category(category_info, config, llm):
         logger.info(f"Starting AI crew for LEGO {category_name} monitoring")
         result = category_monitoring_crew.kickoff()
         
-        # Process results
+        # Parse the analysis once; the whole document is needed for saving, so it is
+        # decoded in a single orjson pass rather than streamed
         try:
-            # Save analysis results
-            analysis_data = json.loads(result)
-            save_analysis_results(analysis_data, category_name)
-            
-            # Save current product data as historical for next run
-            for task in category_monitoring_crew.tasks:
-                if task.agent.role == f"LEGO {category_name} Parser" and hasattr(task, "output"):
-                    try:
-                        parser_output = json.loads(task.output)
-                        save_historical_data(parser_output, category_name)
-                    except Exception as e:
-                        logger.error(f"Could not parse and save parser output as historical data for {category_name}: {e}")
-            
-            # Log a summary of the analysis
-            if "price_changes" in analysis_data:
-                logger.info(f"Found {len(analysis_data['price_changes'])} price changes in LEGO {category_name} sets")
-            if "new_products" in analysis_data:
-                logger.info(f"Found {len(analysis_data['new_products'])} new LEGO {category_name} sets")
-            if "removed_products" in analysis_data:
-                logger.info(f"Found {len(analysis_data['removed_products'])} removed LEGO {category_name} sets")
-                
-        except json.JSONDecodeError as e:
+            analysis_data = orjson.loads(result)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse LEGO {category_name} analysis result as JSON: {e}")
+            return
+        
+        # Save analysis results
+        save_analysis_results(analysis_data, category_name)
+        
+        # Save current product data as historical for next run
+        for task in category_monitoring_crew.tasks:
+            if task.agent.role == f"LEGO {category_name} Parser" and hasattr(task, "output"):
+                try:
+                    parser_output = orjson.loads(task.output)
+                    save_historical_data(parser_output, category_name)
+                except Exception as e:
+                    logger.error(f"Could not parse and save parser output as historical data for {category_name}: {e}")
+        
+        # Log a summary of the analysis
+        if "price_changes" in analysis_data:
+            logger.info(f"Found {len(analysis_data['price_changes'])} price changes in LEGO {category_name} sets")
+        if "new_products" in analysis_data:
+            logger.info(f"Found {len(analysis_data['new_products'])} new LEGO {category_name} sets")
+        if "removed_products" in analysis_data:
+            logger.info(f"Found {len(analysis_data['removed_products'])} removed LEGO {category_name} sets")
     
     except Exception as e:
         logger.error(f"Error during LEGO {category_name} monitoring process: {e}")
 
+# Minimum delay between two categories scraped from the same host
+HOST_REQUEST_INTERVAL_SECONDS = 30
+# Default number of hosts whose categories are processed at the same time. Every
+# category runs a CrewAI kickoff against the same local LLM, so hosts are processed
+# one after another unless "max_concurrent_hosts" is raised in config.json
+MAX_CONCURRENT_HOSTS = 1
+_last_request_by_host = {}
+
+# Wait until the host of the given URL may be contacted again
+def wait_for_host(url):
+    host = urlparse(url).netloc
+    last_request = _last_request_by_host.get(host)
+    if last_request is not None:
+        remaining = HOST_REQUEST_INTERVAL_SECONDS - (time.monotonic() - last_request)
+        if remaining > 0:
+            logger.info(f"Waiting {remaining:.0f}s before contacting {host} again")
+            time.sleep(remaining)
+
+# Record that the host of the given URL has just been contacted
+def mark_host_contacted(url):
+    _last_request_by_host[urlparse(url).netloc] = time.monotonic()
+
+# Process the categories of a single host one after another
+def process_host_categories(categories, config, llm):
+    try:
+        for category_info in categories:
+            # Space out categories on the same host to avoid overloading the server
+            url = category_info.get("url", "")
+            wait_for_host(url)
+            try:
+                process_lego_category(category_info, config, llm)
+            except Exception as e:
+                logger.error(f"Error processing category {category_info.get('name', 'Unknown')}: {e}")
+            finally:
+                mark_host_contacted(url)
+    finally:
+        # The browser belongs to this worker thread, which ends with the run
+        close_browser()
+
 # Main monitoring process that handles all categories
 def run_lego_monitoring():
     logger.info("Starting LEGO product monitoring process for all categories")
@@ -282,13 +358,24 @@ def run_lego_monitoring():
         logger.error("No LEGO categories defined in configuration")
         return
     
+    # Categories on different hosts may be processed concurrently; categories
+    # on the same host stay sequential so the site is not hit in parallel
+    categories_by_host = {}
     for category_info in categories:
-        try:
-            process_lego_category(category_info, config, llm)
-            # Add a delay between categories to avoid overloading the server
-            time.sleep(30)
-        except Exception as e:
-            logger.error(f"Error processing category {category_info.get('name', 'Unknown')}: {e}")
+        host = urlparse(category_info.get("url", "")).netloc
+        categories_by_host.setdefault(host, []).append(category_info)
+    
+    max_concurrent_hosts = max(1, int(config.get("max_concurrent_hosts", MAX_CONCURRENT_HOSTS)))
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_hosts, len(categories_by_host))) as executor:
+        futures = {
+            host: executor.submit(process_host_categories, host_categories, config, llm)
+            for host, host_categories in categories_by_host.items()
+        }
+        for host, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error processing categories for host {host or 'Unknown'}: {e}")
 
 # Schedule the monitoring task
 def schedule_monitoring():
@@ -301,10 +388,12 @@ def schedule_monitoring():
     # Also run immediately on startup
     run_lego_monitoring()
     
-    # Keep the script running
+    # Keep the script running, sleeping until the next job is due instead of polling
     while True:
         schedule.run_pending()
-        time.sleep(60)  # Check every minute
+        idle_seconds = schedule.idle_seconds()
+        if idle_seconds is not None and idle_seconds > 0:
+            time.sleep(idle_seconds)
 
 if __name__ == "__main__":
     logger.info("LEGO product monitoring service starting up")
@@ -0,0 +1,35 @@
+"""
+Request blocking shared by the Playwright scripts
+"""
+
+# Resources that are never needed to read product data from the DOM. Image
+# URLs come from the src attribute, so the image bytes can be skipped
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+# Scripts that only read the DOM can skip stylesheets too; scripts that take
+# screenshots or wait on visibility keep them, since those depend on layout
+BLOCKED_RESOURCE_TYPES_NO_STYLES = BLOCKED_RESOURCE_TYPES | {"stylesheet"}
+BLOCKED_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "facebook.net", "hotjar.com", "segment.io", "segment.com"
+)
+
+def _is_unneeded(request, blocked_resource_types):
+    return request.resource_type in blocked_resource_types or any(domain in request.url for domain in BLOCKED_DOMAINS)
+
+def request_blocker(blocked_resource_types=BLOCKED_RESOURCE_TYPES):
+    """Return a sync route handler that aborts unneeded resources and analytics trackers."""
+    def block_unneeded_requests(route):
+        if _is_unneeded(route.request, blocked_resource_types):
+            route.abort()
+        else:
+            route.continue_()
+    return block_unneeded_requests
+
+def async_request_blocker(blocked_resource_types=BLOCKED_RESOURCE_TYPES):
+    """Return an async route handler that aborts unneeded resources and analytics trackers."""
+    async def block_unneeded_requests(route):
+        if _is_unneeded(route.request, blocked_resource_types):
+            await route.abort()
+        else:
+            await route.continue_()
+    return block_unneeded_requests
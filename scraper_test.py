@@ -4,12 +4,14 @@ This script tests the basic scraping without the CrewAI framework.
 """
 
 import json
+import orjson
 import os
 import sys
-import time
-from playwright.sync_api import sync_playwright
+import asyncio
+from playwright.async_api import async_playwright
 import logging
 import re
+from request_blocking import async_request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +20,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pattern for the 5-digit LEGO set number embedded in image alt text
+_PRODUCT_ID_RE = re.compile(r'(\d{5})')
+
+# Maximum number of categories scraped at the same time
+MAX_CONCURRENT_CATEGORIES = 4
+
+# Stylesheets are kept since visibility waits and lazy loading depend on layout
+block_unneeded_requests = async_request_blocker()
+
+# Runs in the page: reads the fields of the first `limit` product elements.
+# The ID usually comes from the same image alt text as the name, so it is reused.
+_EXTRACT_PRODUCTS_JS = """
+(elements, [selectors, limit]) => {
+    const attr = (el, selector, name) => {
+        const found = el.querySelector(selector);
+        return found ? found.getAttribute(name) : null;
+    };
+    return {
+        count: elements.length,
+        products: elements.slice(0, limit).map(el => {
+            const nameAlt = attr(el, selectors.name, 'alt');
+            const priceElem = el.querySelector(selectors.price);
+            return {
+                name_alt: nameAlt,
+                id_alt: selectors.id === selectors.name ? nameAlt : attr(el, selectors.id, 'alt'),
+                price: priceElem ? priceElem.textContent : null,
+                image_url: attr(el, selectors.image, 'src')
+            };
+        })
+    };
+}
+"""
+
 def load_config():
     """Load the configuration from config.json"""
     try:
@@ -32,8 +67,8 @@ def load_config():
         logger.error("❌ config.json not found")
         sys.exit(1)
 
-def scrape_lego_products(url, config, max_products=5):
-    """Scrape LEGO products from the given URL"""
+async def scrape_lego_products(url, config, context, max_products=5):
+    """Scrape LEGO products from the given URL using a page in the shared browser context"""
     logger.info(f"Scraping products from: {url}")
     
     # Get selectors from config
@@ -45,73 +80,77 @@ def scrape_lego_products(url, config, max_products=5):
     
     products = []
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    page = await context.new_page()
+    
+    try:
+        # Navigate to the page
+        logger.info(f"Navigating to {url}...")
+        await page.goto(url, wait_until='domcontentloaded', timeout=30000)
         
+        # Wait for the product grid to render instead of a fixed sleep
         try:
-            # Navigate to the page
-            logger.info(f"Navigating to {url}...")
-            page.goto(url, wait_until='networkidle')
-            time.sleep(2)  # Allow any JavaScript to execute
-            
-            # Take a screenshot for debugging
-            page.screenshot(path="debug_screenshot.png")
+            await page.locator(product_selector).first.wait_for(state='visible', timeout=15000)
+        except Exception as e:
+            logger.warning(f"Timeout waiting for product elements: {e}")
+        
+        # Take a screenshot for debugging (only when LEGO_DEBUG is set, it is costly)
+        if os.getenv("LEGO_DEBUG"):
+            await page.screenshot(path="debug_screenshot.png")
             logger.info("Screenshot saved to debug_screenshot.png")
+        
+        # Read all product fields in a single call into the browser instead of
+        # several query_selector/get_attribute round-trips per product
+        selectors = {
+            'name': name_selector,
+            'price': price_selector,
+            'id': id_selector,
+            'image': image_selector
+        }
+        result = await page.eval_on_selector_all(product_selector, _EXTRACT_PRODUCTS_JS, [selectors, max_products])
+        logger.info(f"Found {result['count']} products")
+        
+        # Process limited number of products
+        for i, fields in enumerate(result['products']):
+            product = {}
             
-            # Extract products
-            product_elements = page.query_selector_all(product_selector)
-            logger.info(f"Found {len(product_elements)} products")
+            # Extract product name
+            if fields['name_alt']:
+                product['name'] = fields['name_alt']
+                # Clean up the name if it contains product ID
+                if '-' in product['name']:
+                    product['name'] = product['name'].split('-')[0].strip()
+            else:
+                product['name'] = "Unknown"
             
-            # Process limited number of products
-            for i, product_elem in enumerate(product_elements[:max_products]):
-                product = {}
-                
-                # Extract product name
-                name_elem = product_elem.query_selector(name_selector)
-                if name_elem and name_elem.get_attribute('alt'):
-                    product['name'] = name_elem.get_attribute('alt')
-                    # Clean up the name if it contains product ID
-                    if '-' in product['name']:
-                        product['name'] = product['name'].split('-')[0].strip()
-                else:
-                    product['name'] = "Unknown"
-                
-                # Extract product ID
-                id_elem = product_elem.query_selector(id_selector)
-                if id_elem and id_elem.get_attribute('alt'):
-                    alt_text = id_elem.get_attribute('alt')
-                    # Try to extract the ID from the alt text using regex
-                    id_match = re.search(r'(\d{5})', alt_text)
-                    if id_match:
-                        product['id'] = id_match.group(1)
-                    else:
-                        product['id'] = "Unknown"
+            # Extract product ID
+            alt_text = fields['id_alt']
+            if alt_text:
+                # Try to extract the ID from the alt text using regex
+                id_match = _PRODUCT_ID_RE.search(alt_text)
+                if id_match:
+                    product['id'] = id_match.group(1)
                 else:
                     product['id'] = "Unknown"
-                
-                # Extract price
-                price_elem = product_elem.query_selector(price_selector)
-                if price_elem:
-                    product['price'] = price_elem.text_content().strip()
-                else:
-                    product['price'] = "Unknown"
-                
-                # Extract image URL
-                img_elem = product_elem.query_selector(image_selector)
-                if img_elem and img_elem.get_attribute('src'):
-                    product['image_url'] = img_elem.get_attribute('src')
-                else:
-                    product['image_url'] = "Unknown"
-                
-                products.append(product)
-                logger.info(f"Product {i+1}: {product['name']} - {product['price']} - {product['id']}")
+            else:
+                product['id'] = "Unknown"
             
-        except Exception as e:
-            logger.error(f"Error during scraping: {e}")
-        finally:
-            browser.close()
-    
+            # Extract price
+            if fields['price'] is not None:
+                product['price'] = fields['price'].strip()
+            else:
+                product['price'] = "Unknown"
+            
+            # Extract image URL
+            product['image_url'] = fields['image_url'] or "Unknown"
+            
+            products.append(product)
+            logger.info(f"Product {i+1}: {product['name']} - {product['price']} - {product['id']}")
+        
+    except Exception as e:
+        logger.error(f"Error during scraping: {e}")
+    finally:
+        await page.close()
+
     return products
 
 def save_products_to_file(products, category_name):
@@ -120,13 +159,29 @@ def save_products_to_file(products, category_name):
     os.makedirs("data", exist_ok=True)
     
     try:
-        with open(filename, 'w') as f:
-            json.dump(products, f, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(products, option=orjson.OPT_INDENT_2))
         logger.info(f"Saved {len(products)} products to {filename}")
     except Exception as e:
         logger.error(f"Error saving products to file: {e}")
 
-def main():
+async def scrape_category(category, config, context, semaphore):
+    """Scrape a single category and save its products, bounded by the shared semaphore"""
+    category_name = category.get('name', 'Unknown')
+    url = category.get('url', '')
+    
+    if not url:
+        logger.warning(f"No URL provided for category: {category_name}")
+        return
+    
+    async with semaphore:
+        logger.info(f"Processing category: {category_name}")
+        products = await scrape_lego_products(url, config, context)
+    
+    if products:
+        save_products_to_file(products, category_name)
+
+async def main():
     """Main function to run the test"""
     logger.info("=== LEGO Price Monitor Scraper Test ===")
     
@@ -140,22 +195,23 @@ def main():
         logger.error("No LEGO categories found in config")
         return
     
-    # Scrape each category
-    for category in categories:
-        category_name = category.get('name', 'Unknown')
-        url = category.get('url', '')
-        
-        if not url:
-            logger.warning(f"No URL provided for category: {category_name}")
-            continue
+    # Scrape categories concurrently, sharing one browser and context (and its cookies).
+    # The semaphore caps how many pages hit the site at once.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CATEGORIES)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        await context.route("**/*", block_unneeded_requests)
         
-        logger.info(f"Processing category: {category_name}")
-        products = scrape_lego_products(url, config)
-        
-        if products:
-            save_products_to_file(products, category_name)
+        try:
+            await asyncio.gather(*[
+                scrape_category(category, config, context, semaphore)
+                for category in categories
+            ])
+        finally:
+            await browser.close()
     
     logger.info("=== Scraping Test Completed ===")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
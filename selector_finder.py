@@ -4,12 +4,14 @@ LEGO Selector Finder - Analyzes the page to find the correct selectors
 """
 
 import os
-import json
+import atexit
+import orjson
 import logging
-from bs4 import BeautifulSoup
+import requests
 from playwright.sync_api import sync_playwright
 import sys
 import re
+from request_blocking import BLOCKED_RESOURCE_TYPES_NO_STYLES, request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -26,191 +28,282 @@ logger = logging.getLogger(__name__)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Only the DOM structure is analysed, so stylesheets are blocked as well;
+# documents, scripts and XHR still go through
+block_unneeded_requests = request_blocker(BLOCKED_RESOURCE_TYPES_NO_STYLES)
+
+# Browser shared by every find_selectors() call in this process, started on first use
+_playwright = None
+_browser = None
+_browser_context = None
+
+def _get_browser_context():
+    """Return the shared browser context, launching Chromium on first use."""
+    global _playwright, _browser, _browser_context
+    if _browser_context is None:
+        _playwright = sync_playwright().start()
+        _browser = _playwright.chromium.launch(headless=True)
+        _browser_context = _browser.new_context()
+        _browser_context.route("**/*", block_unneeded_requests)
+        atexit.register(_close_browser)
+    return _browser_context
+
+def _close_browser():
+    """Close the shared browser and stop Playwright."""
+    global _playwright, _browser, _browser_context
+    if _browser is not None:
+        _browser.close()
+        _playwright.stop()
+    _playwright = _browser = _browser_context = None
+
+# The last analysis is reused while the page's ETag (or Last-Modified) is unchanged
+SELECTORS_FILE = 'data/found_selectors.json'
+PAGE_VERSION_FILE = 'data/found_selectors.etag'
+
+def get_page_version(url):
+    """Return the page's ETag or Last-Modified header, or None if unavailable."""
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=5)
+    except requests.RequestException as e:
+        logger.warning(f"Could not check page version: {e}")
+        return None
+    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+def load_cached_selectors(page_version):
+    """Return the saved selectors if they were found for the given page version."""
+    try:
+        with open(PAGE_VERSION_FILE, 'r', encoding='utf-8') as f:
+            if f.read() != page_version:
+                return None
+        with open(SELECTORS_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+
 def find_selectors():
     """Find the correct selectors for the LEGO page."""
     url = "https://lego.tr/themes/architecture"
     logger.info(f"Analyzing page: {url}")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    # Skip the browser entirely when the page has not changed since the last run
+    page_version = get_page_version(url)
+    if page_version is not None:
+        selectors = load_cached_selectors(page_version)
+        if selectors is not None:
+            logger.info(f"Page unchanged ({page_version}), reusing selectors from {SELECTORS_FILE}")
+            return selectors
+    
+    page = _get_browser_context().new_page()
+    
+    try:
+        logger.info(f"Navigating to {url}")
+        page.goto(url, wait_until="domcontentloaded", timeout=30000)
         
-        try:
-            logger.info(f"Navigating to {url}")
-            page.goto(url, wait_until="networkidle", timeout=60000)
-            
-            # Wait for any dynamic content to load
-            page.wait_for_timeout(5000)
-            
-            # Use JavaScript to identify potential selectors
-            selectors = page.evaluate("""
-                () => {
-                    // Find product containers
-                    const productContainers = document.querySelectorAll('.product-item');
-                    if (productContainers.length === 0) return { error: 'No product containers found' };
-                    
-                    // Get a sample product
-                    const sampleProduct = productContainers[0];
+        # Wait until product containers are rendered rather than for the network to go idle
+        page.wait_for_function("document.querySelectorAll('.product-item').length > 0", timeout=15000)
+        
+        # Use JavaScript to identify potential selectors
+        selectors = page.evaluate("""
+            () => {
+                // Find product containers
+                const productContainers = document.querySelectorAll('.product-item');
+                if (productContainers.length === 0) return { error: 'No product containers found' };
+                
+                // Get a sample product
+                const sampleProduct = productContainers[0];
+                
+                // Find all meaningful elements in the product
+                const results = {
+                    container: '.product-item',
+                    products_found: productContainers.length,
+                    selectors: {}
+                };
+                
+                // Function to find potential selectors for a specific type of data
+                const findPotentialSelectors = (element, attrNames) => {
+                    if (!element) return [];
                     
-                    // Find all meaningful elements in the product
-                    const results = {
-                        container: '.product-item',
-                        products_found: productContainers.length,
-                        selectors: {}
-                    };
+                    const selectors = [];
                     
-                    // Function to find potential selectors for a specific type of data
-                    const findPotentialSelectors = (element, attrNames) => {
-                        if (!element) return [];
-                        
-                        const selectors = [];
-                        
-                        // Try to find by classes
-                        if (element.className) {
-                            const classNames = element.className.split(' ').filter(c => c.trim());
-                            if (classNames.length > 0) {
-                                selectors.push('.' + classNames.join('.'));
-                            }
+                    // Try to find by classes
+                    if (element.className) {
+                        const classNames = element.className.split(' ').filter(c => c.trim());
+                        if (classNames.length > 0) {
+                            selectors.push('.' + classNames.join('.'));
                         }
-                        
-                        // Try to find by attribute (data-test, etc)
-                        for (const attr of attrNames) {
-                            if (element.hasAttribute(attr)) {
-                                selectors.push(`[${attr}="${element.getAttribute(attr)}"]`);
-                            }
-                        }
-                        
-                        // Try by tag name and position
-                        selectors.push(element.tagName.toLowerCase());
-                        
-                        return selectors;
-                    };
-                    
-                    // Try to find the title/name
-                    const titleElement = 
-                        sampleProduct.querySelector('h3') || 
-                        sampleProduct.querySelector('h2') || 
-                        sampleProduct.querySelector('.product-name') ||
-                        sampleProduct.querySelector('[data-test="product-title"]');
-                    
-                    if (titleElement) {
-                        results.selectors.title = {
-                            potential_selectors: findPotentialSelectors(titleElement, ['data-test', 'id']),
-                            text_content: titleElement.textContent.trim()
-                        };
-                    }
-                    
-                    // Try to find the price
-                    const priceElement = 
-                        sampleProduct.querySelector('.price') || 
-                        sampleProduct.querySelector('.product-price') || 
-                        sampleProduct.querySelector('[data-test="price"]');
-                    
-                    if (priceElement) {
-                        results.selectors.price = {
-                            potential_selectors: findPotentialSelectors(priceElement, ['data-test', 'id']),
-                            text_content: priceElement.textContent.trim()
-                        };
                     }
                     
-                    // Try to find the product ID
-                    const idElement = 
-                        sampleProduct.querySelector('.product-id') || 
-                        sampleProduct.querySelector('[data-test="product-item-number"]') ||
-                        sampleProduct.querySelector('[data-element="product-number"]');
-                    
-                    if (idElement) {
-                        results.selectors.id = {
-                            potential_selectors: findPotentialSelectors(idElement, ['data-test', 'data-element', 'id']),
-                            text_content: idElement.textContent.trim()
-                        };
+                    // Try to find by attribute (data-test, etc)
+                    for (const attr of attrNames) {
+                        if (element.hasAttribute(attr)) {
+                            selectors.push(`[${attr}="${element.getAttribute(attr)}"]`);
+                        }
                     }
                     
-                    // Try to find the image
-                    const imageElement = sampleProduct.querySelector('img');
+                    // Try by tag name and position
+                    selectors.push(element.tagName.toLowerCase());
                     
-                    if (imageElement) {
-                        results.selectors.image = {
-                            potential_selectors: findPotentialSelectors(imageElement, ['data-test', 'id']),
-                            src: imageElement.src,
-                            alt: imageElement.alt
-                        };
+                    return selectors;
+                };
+                
+                // Walk the sample product once, keeping for each field the best-ranked
+                // element (lower rank wins, earlier in document order on ties)
+                const rankers = {
+                    title: el => {
+                        if (el.tagName === 'H3') return 0;
+                        if (el.tagName === 'H2') return 1;
+                        if (el.classList.contains('product-name')) return 2;
+                        if (el.getAttribute('data-test') === 'product-title') return 3;
+                        return -1;
+                    },
+                    price: el => {
+                        if (el.classList.contains('price')) return 0;
+                        if (el.classList.contains('product-price')) return 1;
+                        if (el.getAttribute('data-test') === 'price') return 2;
+                        return -1;
+                    },
+                    id: el => {
+                        if (el.classList.contains('product-id')) return 0;
+                        if (el.getAttribute('data-test') === 'product-item-number') return 1;
+                        if (el.getAttribute('data-element') === 'product-number') return 2;
+                        return -1;
+                    },
+                    image: el => el.tagName === 'IMG' ? 0 : -1,
+                    title_link: el => {
+                        if (el.tagName !== 'A') return -1;
+                        const href = el.getAttribute('href');
+                        if (href !== null && href.includes('products')) return 0;
+                        if (el.hasAttribute('title')) return 1;
+                        return -1;
                     }
-                    
-                    // Try to find additional product information
-                    const titleLinkElement = 
-                        sampleProduct.querySelector('a[href*="products"]') || 
-                        sampleProduct.querySelector('a[title]');
-                    
-                    if (titleLinkElement) {
-                        results.selectors.title_link = {
-                            potential_selectors: findPotentialSelectors(titleLinkElement, ['data-test', 'id']),
-                            href: titleLinkElement.href,
-                            text_content: titleLinkElement.textContent.trim()
-                        };
+                };
+                const best = {};
+                const walker = document.createTreeWalker(sampleProduct, NodeFilter.SHOW_ELEMENT);
+                for (let el = walker.nextNode(); el; el = walker.nextNode()) {
+                    for (const field in rankers) {
+                        const rank = rankers[field](el);
+                        if (rank >= 0 && (!best[field] || rank < best[field].rank)) {
+                            best[field] = { el, rank };
+                        }
                     }
-                    
-                    return results;
                 }
-            """)
-            
-            logger.info(f"Found selectors: {json.dumps(selectors, indent=2)}")
-            
-            # Save selectors to file
-            with open('data/found_selectors.json', 'w', encoding='utf-8') as f:
-                json.dump(selectors, f, indent=2, ensure_ascii=False)
-            logger.info("Saved selectors to data/found_selectors.json")
-            
-            # Create recommended config
-            recommended_config = {
-                "lego_categories": [
-                    {
-                        "name": "Architecture",
-                        "url": "https://lego.tr/themes/architecture"
-                    }
-                ],
-                "scrape_interval_hours": 6,
-                "product_selector": selectors.get("container", ".product-item"),
-                "price_selector": ", ".join(selectors.get("selectors", {}).get("price", {}).get("potential_selectors", [".price"]))
+                const found = field => best[field] ? best[field].el : null;
+                
+                const titleElement = found('title');
+                if (titleElement) {
+                    results.selectors.title = {
+                        potential_selectors: findPotentialSelectors(titleElement, ['data-test', 'id']),
+                        text_content: titleElement.textContent.trim()
+                    };
+                }
+                
+                const priceElement = found('price');
+                if (priceElement) {
+                    results.selectors.price = {
+                        potential_selectors: findPotentialSelectors(priceElement, ['data-test', 'id']),
+                        text_content: priceElement.textContent.trim()
+                    };
+                }
+                
+                const idElement = found('id');
+                if (idElement) {
+                    results.selectors.id = {
+                        potential_selectors: findPotentialSelectors(idElement, ['data-test', 'data-element', 'id']),
+                        text_content: idElement.textContent.trim()
+                    };
+                }
+                
+                const imageElement = found('image');
+                if (imageElement) {
+                    results.selectors.image = {
+                        potential_selectors: findPotentialSelectors(imageElement, ['data-test', 'id']),
+                        src: imageElement.src,
+                        alt: imageElement.alt
+                    };
+                }
+                
+                const titleLinkElement = found('title_link');
+                if (titleLinkElement) {
+                    results.selectors.title_link = {
+                        potential_selectors: findPotentialSelectors(titleLinkElement, ['data-test', 'id']),
+                        href: titleLinkElement.href,
+                        text_content: titleLinkElement.textContent.trim()
+                    };
+                }
+                
+                return results;
             }
-            
-            # Add title selector if found
-            if "title" in selectors.get("selectors", {}):
-                recommended_config["name_selector"] = ", ".join(selectors.get("selectors", {}).get("title", {}).get("potential_selectors", []))
-            elif "title_link" in selectors.get("selectors", {}):
-                recommended_config["name_selector"] = ", ".join(selectors.get("selectors", {}).get("title_link", {}).get("potential_selectors", []))
-            
-            # Add id selector if found
-            if "id" in selectors.get("selectors", {}):
-                recommended_config["id_selector"] = ", ".join(selectors.get("selectors", {}).get("id", {}).get("potential_selectors", []))
-            
-            # Add image selector if found
-            if "image" in selectors.get("selectors", {}):
-                recommended_config["image_selector"] = ", ".join(selectors.get("selectors", {}).get("image", {}).get("potential_selectors", ["img"]))
-            
-            # Add other config fields
-            recommended_config["description_selector"] = ".product-description"
-            recommended_config["ollama_host"] = "localhost"
-            recommended_config["ollama_port"] = "11434"
-            recommended_config["ollama_model"] = "llama3"
-            recommended_config["price_threshold_percent"] = 5.0
-            recommended_config["use_javascript"] = True
-            recommended_config["max_pages"] = 5
-            
-            # Save recommended config
-            with open('data/recommended_config.json', 'w', encoding='utf-8') as f:
-                json.dump(recommended_config, f, indent=2, ensure_ascii=False)
-            logger.info("Saved recommended config to data/recommended_config.json")
-            
-            return selectors
-            
-        except Exception as e:
-            logger.error(f"Error finding selectors: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return None
-        finally:
-            browser.close()
+        """)
+        
+        # Serialize once for both the log message and the saved file
+        selectors_json = orjson.dumps(selectors, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        logger.info("Found selectors: %s", selectors_json.decode("utf-8"))
+        
+        # Drop the old page version first, so it can never be paired with a
+        # result it does not belong to (e.g. an error result saved below)
+        try:
+            os.remove(PAGE_VERSION_FILE)
+        except FileNotFoundError:
+            pass
+        
+        # Save selectors to file
+        with open(SELECTORS_FILE, 'wb') as f:
+            f.write(selectors_json)
+        logger.info(f"Saved selectors to {SELECTORS_FILE}")
+        
+        # Create recommended config
+        recommended_config = {
+            "lego_categories": [
+                {
+                    "name": "Architecture",
+                    "url": "https://lego.tr/themes/architecture"
+                }
+            ],
+            "scrape_interval_hours": 6,
+            "product_selector": selectors.get("container", ".product-item"),
+            "price_selector": ", ".join(selectors.get("selectors", {}).get("price", {}).get("potential_selectors", [".price"]))
+        }
+        
+        # Add title selector if found
+        if "title" in selectors.get("selectors", {}):
+            recommended_config["name_selector"] = ", ".join(selectors.get("selectors", {}).get("title", {}).get("potential_selectors", []))
+        elif "title_link" in selectors.get("selectors", {}):
+            recommended_config["name_selector"] = ", ".join(selectors.get("selectors", {}).get("title_link", {}).get("potential_selectors", []))
+        
+        # Add id selector if found
+        if "id" in selectors.get("selectors", {}):
+            recommended_config["id_selector"] = ", ".join(selectors.get("selectors", {}).get("id", {}).get("potential_selectors", []))
+        
+        # Add image selector if found
+        if "image" in selectors.get("selectors", {}):
+            recommended_config["image_selector"] = ", ".join(selectors.get("selectors", {}).get("image", {}).get("potential_selectors", ["img"]))
+        
+        # Add other config fields
+        recommended_config["description_selector"] = ".product-description"
+        recommended_config["ollama_host"] = "localhost"
+        recommended_config["ollama_port"] = "11434"
+        recommended_config["ollama_model"] = "llama3"
+        recommended_config["price_threshold_percent"] = 5.0
+        recommended_config["use_javascript"] = True
+        recommended_config["max_pages"] = 5
+        
+        # Save recommended config
+        with open('data/recommended_config.json', 'wb') as f:
+            f.write(orjson.dumps(recommended_config, option=orjson.OPT_INDENT_2))
+        logger.info("Saved recommended config to data/recommended_config.json")
+        
+        # Remember which page version these selectors belong to
+        if page_version is not None and "error" not in selectors:
+            with open(PAGE_VERSION_FILE, 'w', encoding='utf-8') as f:
+                f.write(page_version)
+        
+        return selectors
+        
+    except Exception as e:
+        logger.exception("Error finding selectors: %s", e)
+        return None
+    finally:
+        page.close()
 
 if __name__ == "__main__":
     logger.info("Starting selector finder")
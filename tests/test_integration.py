@@ -3,21 +3,54 @@ Test script to verify the updated configuration with minimal dependencies.
 This script directly tests the scraping functionality without relying on the CrewAI tools.
 """
 
-import json
+import functools
+import orjson
 import os
+import py_compile
 import sys
 from playwright.sync_api import sync_playwright
 import re
-import time
+from blocking_helpers import BLOCKED_RESOURCE_TYPES_NO_STYLES, request_blocker
 
+# Pattern for the 5-digit LEGO set number embedded in image alt text
+_PRODUCT_ID_RE = re.compile(r'(\d{5})')
+
+# Only the DOM is read, so stylesheets are blocked along with images, fonts and media
+block_unneeded_requests = request_blocker(BLOCKED_RESOURCE_TYPES_NO_STYLES)
+
+# Runs in the page: reads the fields of the first `limit` product elements.
+# The ID usually comes from the same image alt text as the name, so it is reused.
+_EXTRACT_PRODUCTS_JS = """
+(elements, [selectors, limit]) => {
+    const attr = (el, selector, name) => {
+        const found = el.querySelector(selector);
+        return found ? found.getAttribute(name) : null;
+    };
+    return {
+        count: elements.length,
+        products: elements.slice(0, limit).map(el => {
+            const nameAlt = attr(el, selectors.name, 'alt');
+            const priceElem = el.querySelector(selectors.price);
+            return {
+                name_alt: nameAlt,
+                id_alt: selectors.id === selectors.name ? nameAlt : attr(el, selectors.id, 'alt'),
+                price: priceElem ? priceElem.textContent : null,
+                image_url: attr(el, selectors.image, 'src')
+            };
+        })
+    };
+}
+"""
+
+@functools.lru_cache(maxsize=1)
 def load_config():
     """Load the configuration from config.json"""
     try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
+        with open('config.json', 'rb') as f:
+            config = orjson.loads(f.read())
             print("✅ Config loaded successfully")
             return config
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"❌ Error loading config: {e}")
         sys.exit(1)
     except FileNotFoundError:
@@ -38,66 +71,79 @@ def test_scraping(config):
     id_selector = config.get('id_selector', 'img[alt]')
     image_selector = config.get('image_selector', '.lazyloaded')
     
-    print(f"Using selectors:")
-    print(f"  Product: {product_selector}")
-    print(f"  Name: {name_selector}")
-    print(f"  Price: {price_selector}")
-    print(f"  ID: {id_selector}")
-    print(f"  Image: {image_selector}")
+    print(
+        "Using selectors:\n"
+        f"  Product: {product_selector}\n"
+        f"  Name: {name_selector}\n"
+        f"  Price: {price_selector}\n"
+        f"  ID: {id_selector}\n"
+        f"  Image: {image_selector}"
+    )
     
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        page.route("**/*", block_unneeded_requests)
         
         try:
             # Navigate to the page
             print(f"\nNavigating to {category['url']}...")
-            page.goto(category['url'], wait_until='networkidle')
-            time.sleep(2)  # Allow any JavaScript to execute
+            page.goto(category['url'], wait_until='domcontentloaded')
+            
+            # Wait for the products to be rendered rather than sleeping
+            try:
+                page.wait_for_selector(product_selector, state='attached', timeout=15000)
+            except Exception as e:
+                print(f"⚠️ Timeout waiting for products: {e}")
             
-            # Extract products
-            products = page.query_selector_all(product_selector)
-            print(f"Found {len(products)} products")
+            # Read the fields of the first 3 products in a single call into the
+            # browser instead of several round-trips per product
+            selectors = {
+                'name': name_selector,
+                'price': price_selector,
+                'id': id_selector,
+                'image': image_selector
+            }
+            result = page.eval_on_selector_all(product_selector, _EXTRACT_PRODUCTS_JS, [selectors, 3])
+            print(f"Found {result['count']} products")
             
-            if len(products) == 0:
+            if result['count'] == 0:
                 print("❌ No products found. Selector might be incorrect.")
                 return
             
-            print("\nProduct details:")
-            # Process first 3 products
-            for i, product in enumerate(products[:3]):
+            # Collect the report and write it once rather than line by line
+            report = ["\nProduct details:"]
+            for i, fields in enumerate(result['products']):
                 # Extract product name
-                name_elem = product.query_selector(name_selector)
-                name = name_elem.get_attribute('alt') if name_elem else "Unknown"
+                name = fields['name_alt'] or "Unknown"
                 
                 # Clean up the name if it contains product ID
-                if name and '-' in name:
+                if '-' in name:
                     name = name.split('-')[0].strip()
                 
                 # Extract product ID
-                id_elem = product.query_selector(id_selector)
                 product_id = "Unknown"
-                if id_elem and id_elem.get_attribute('alt'):
-                    alt_text = id_elem.get_attribute('alt')
+                alt_text = fields['id_alt']
+                if alt_text:
                     # Try to extract the ID from the alt text using regex
-                    id_match = re.search(r'(\d{5})', alt_text)
+                    id_match = _PRODUCT_ID_RE.search(alt_text)
                     if id_match:
                         product_id = id_match.group(1)
                 
                 # Extract price
-                price_elem = product.query_selector(price_selector)
-                price = price_elem.text_content().strip() if price_elem else "Unknown"
+                price = fields['price'].strip() if fields['price'] is not None else "Unknown"
                 
                 # Extract image URL
-                img_elem = product.query_selector(image_selector)
-                img_url = img_elem.get_attribute('src') if img_elem else "Unknown"
+                img_url = fields['image_url'] or "Unknown"
                 
-                print(f"Product {i+1}:")
-                print(f"  Name: {name}")
-                print(f"  ID: {product_id}")
-                print(f"  Price: {price}")
-                print(f"  Image: {img_url}")
-                print()
+                report.append(
+                    f"Product {i+1}:\n"
+                    f"  Name: {name}\n"
+                    f"  ID: {product_id}\n"
+                    f"  Price: {price}\n"
+                    f"  Image: {img_url}\n"
+                )
+            print("\n".join(report))
             
             print("✅ Scraping test completed successfully")
         except Exception as e:
@@ -106,14 +152,15 @@ def test_scraping(config):
             browser.close()
 
 def test_main_file():
-    """Test if main.py can be imported without errors"""
-    print("\n--- Testing main.py import ---")
+    """Test if main.py compiles without errors"""
+    print("\n--- Testing main.py compilation ---")
     try:
-        # Just check if it can be imported
-        import main
-        print("✅ main.py imported successfully")
-    except Exception as e:
-        print(f"❌ Error importing main.py: {e}")
+        # A syntax check only: importing main.py would run its module-level
+        # setup (logging handlers, directories, crew imports)
+        py_compile.compile('main.py', doraise=True)
+        print("✅ main.py compiled successfully")
+    except (py_compile.PyCompileError, OSError) as e:
+        print(f"❌ Error compiling main.py: {e}")
 
 def main():
     """Main test function"""
@@ -125,7 +172,7 @@ def main():
     # Test scraping with our config
     test_scraping(config)
     
-    # Test if main.py can be imported
+    # Test if main.py compiles
     test_main_file()
     
     print("\n=== Test Completed ===")
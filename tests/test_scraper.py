@@ -4,12 +4,16 @@ LEGO Scraper Test - Tests if the scraper can extract products from the URL speci
 """
 
 import os
-import json
+import functools
+import orjson
 import logging
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve as sv
 from playwright.sync_api import sync_playwright
 import sys
 import time
+import re
+from blocking_helpers import BLOCKED_RESOURCE_TYPES_NO_STYLES, request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -26,11 +30,18 @@ logger = logging.getLogger(__name__)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Only the DOM is read, so stylesheets are blocked along with images, fonts and media
+block_unneeded_requests = request_blocker(BLOCKED_RESOURCE_TYPES_NO_STYLES)
+
+# Extracted products are appended here, one JSON object per line
+EXTRACTED_PRODUCTS_FILE = 'data/extracted_products.jsonl'
+
 # Load configuration
+@functools.lru_cache(maxsize=1)
 def load_config():
     try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
+        with open('config.json', 'rb') as f:
+            return orjson.loads(f.read())
     except FileNotFoundError:
         logger.warning("Config file not found, using defaults")
         return {
@@ -44,6 +55,14 @@ def load_config():
             "max_pages": 1
         }
 
+def product_strainer(product_selector):
+    """Return a SoupStrainer for a single-class selector such as '.product-item', else None."""
+    match = re.fullmatch(r'\.([\w-]+)', product_selector.strip())
+    if not match:
+        return None
+    # Match the class anywhere in a multi-class attribute, not just the whole value
+    return SoupStrainer(class_=re.compile(r'(?:^|\s)' + re.escape(match.group(1)) + r'(?:\s|$)'))
+
 def scrape_lego_products():
     """Test the scraper's ability to extract LEGO products."""
     config = load_config()
@@ -54,13 +73,18 @@ def scrape_lego_products():
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        page.route("**/*", block_unneeded_requests)
         
         try:
             logger.info(f"Navigating to {category['url']}")
-            page.goto(category['url'], wait_until="networkidle", timeout=60000)
+            page.goto(category['url'], wait_until="domcontentloaded", timeout=30000)
             
-            # Wait for any dynamic content to load
-            page.wait_for_timeout(5000)
+            # Wait for the products to be rendered rather than for the network to go idle
+            product_selector_css = config.get("product_selector", ".product-item")
+            try:
+                page.wait_for_selector(product_selector_css, state="attached", timeout=15000)
+            except Exception as e:
+                logger.warning(f"Timeout waiting for product elements: {str(e)}")
             
             # Get page title
             title = page.title()
@@ -68,65 +92,71 @@ def scrape_lego_products():
             
             # Get page content
             content = page.content()
-            soup = BeautifulSoup(content, 'html.parser')
+            
+            # Parse with lxml, and only build product elements into the tree when
+            # the product selector is a plain class
+            soup = BeautifulSoup(content, 'lxml', parse_only=product_strainer(product_selector_css))
+            
+            # Compile the selectors once rather than re-parsing them for every product
+            product_selector = sv.compile(product_selector_css)
+            name_selector = sv.compile(config.get("name_selector", ".product-item__title, .product-name"))
+            price_selector = sv.compile(config.get("price_selector", ".product-price, .product-item__price"))
+            id_selector = sv.compile(config.get("id_selector", ".product-id, [data-test='product-item-number']"))
+            image_selector = sv.compile(config.get("image_selector", ".product-item__image img, .product-image img"))
             
             # Extract product elements
-            product_selector = config.get("product_selector", ".product-item")
-            products = soup.select(product_selector)
+            products = product_selector.select(soup)
             
             logger.info(f"Found {len(products)} products on the page")
             
-            # Extract product details
+            # Extract product details, appending each one to the JSON Lines file
+            # and flushing it as soon as it is extracted. The list is still kept
+            # because scrape_lego_products returns the products to its caller
             extracted_products = []
-            for i, product in enumerate(products[:5]):  # Get first 5 products
-                try:
-                    # Extract product name
-                    name_selector = config.get("name_selector", ".product-item__title, .product-name")
-                    name_elem = product.select_one(name_selector)
-                    name = name_elem.text.strip() if name_elem else "Unknown"
-                    
-                    # Extract price
-                    price_selector = config.get("price_selector", ".product-price, .product-item__price")
-                    price_elem = product.select_one(price_selector)
-                    price = price_elem.text.strip() if price_elem else "Unknown"
-                    
-                    # Extract ID
-                    id_selector = config.get("id_selector", ".product-id, [data-test='product-item-number']")
-                    id_elem = product.select_one(id_selector)
-                    product_id = id_elem.text.strip() if id_elem else "Unknown"
-                    
-                    # Extract image URL
-                    image_selector = config.get("image_selector", ".product-item__image img, .product-image img")
-                    image_elem = product.select_one(image_selector)
-                    image_url = image_elem['src'] if image_elem and 'src' in image_elem.attrs else "Unknown"
-                    
-                    # Create product data
-                    product_data = {
-                        "name": name,
-                        "price": price,
-                        "id": product_id,
-                        "image_url": image_url,
-                        "category": category["name"]
-                    }
-                    
-                    extracted_products.append(product_data)
-                    logger.info(f"Product {i+1}: {name} - {price}")
-                    
-                except Exception as e:
-                    logger.error(f"Error extracting product data: {str(e)}")
+            if products:
+                with open(EXTRACTED_PRODUCTS_FILE, 'ab') as output:
+                    for i, product in enumerate(products[:5]):  # Get first 5 products
+                        try:
+                            # Extract product name
+                            name_elem = name_selector.select_one(product)
+                            name = name_elem.text.strip() if name_elem else "Unknown"
+                            
+                            # Extract price
+                            price_elem = price_selector.select_one(product)
+                            price = price_elem.text.strip() if price_elem else "Unknown"
+                            
+                            # Extract ID
+                            id_elem = id_selector.select_one(product)
+                            product_id = id_elem.text.strip() if id_elem else "Unknown"
+                            
+                            # Extract image URL
+                            image_elem = image_selector.select_one(product)
+                            image_url = image_elem['src'] if image_elem and 'src' in image_elem.attrs else "Unknown"
+                            
+                            # Create product data
+                            product_data = {
+                                "name": name,
+                                "price": price,
+                                "id": product_id,
+                                "image_url": image_url,
+                                "category": category["name"]
+                            }
+                            
+                            output.write(orjson.dumps(product_data) + b"\n")
+                            output.flush()
+                            extracted_products.append(product_data)
+                            logger.info(f"Product {i+1}: {name} - {price}")
+                            
+                        except Exception as e:
+                            logger.error(f"Error extracting product data: {str(e)}")
             
-            # Save extracted products to file
             if extracted_products:
-                with open('data/extracted_products.json', 'w', encoding='utf-8') as f:
-                    json.dump(extracted_products, f, indent=2, ensure_ascii=False)
-                logger.info(f"Saved {len(extracted_products)} products to data/extracted_products.json")
+                logger.info(f"Appended {len(extracted_products)} products to {EXTRACTED_PRODUCTS_FILE}")
             
             return extracted_products
             
         except Exception as e:
-            logger.error(f"Error during scraping: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error during scraping: %s", e)
             return []
         finally:
             browser.close()
@@ -1,11 +1,13 @@
 import os
-import json
+import functools
+import orjson
 import logging
 from datetime import datetime
 import time
 from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright
 import sys
+from blocking_helpers import request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +24,64 @@ logger = logging.getLogger(__name__)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Common selectors for product grids, tried in order
+PRODUCT_CONTAINER_SELECTORS = [
+    '.product-item', '.product-card',
+    '[data-test="product-item"]', '.product',
+    '.product-grid-item', '.set-item',
+    'article', '.ProductGridItem__Container',
+    '[data-test="product-leaf"]'
+]
+NAME_SELECTORS = ['.product-name', '.name', 'h2', 'h3', '[data-test="product-title"]', '.title']
+PRICE_SELECTORS = ['.price', '.product-price', '[data-test="price"]', '[data-test="product-price"]']
+
+# Runs in the page: returns the first container selector that matches anything
+_FIND_PRODUCTS_JS = """
+(selectors) => {
+    for (const selector of selectors) {
+        const elements = document.querySelectorAll(selector);
+        if (elements.length > 0) {
+            console.log('Found products with selector:', selector);
+            return {selector: selector, count: elements.length};
+        }
+    }
+    
+    return {selector: null, count: 0};
+}
+"""
+
+# Runs in the page: reads name and price of the first `limit` products. The
+# selectors are passed as arguments, so the script text never changes
+_EXTRACT_PRODUCT_INFO_JS = """
+([selector, nameSelectors, priceSelectors, limit]) => {
+    const firstText = (product, selectors) => {
+        for (const s of selectors) {
+            const el = product.querySelector(s);
+            if (el && el.textContent.trim()) {
+                return el.textContent.trim();
+            }
+        }
+        return '';
+    };
+    
+    return Array.from(document.querySelectorAll(selector))
+        .slice(0, limit)
+        .map(product => ({
+            name: firstText(product, nameSelectors),
+            price: firstText(product, priceSelectors)
+        }));
+}
+"""
+
+# Stylesheets are kept so the saved screenshot still shows the page layout
+block_unneeded_requests = request_blocker()
+
 # Load configuration
+@functools.lru_cache(maxsize=1)
 def load_config():
     try:
-        with open('test_config.json', 'r') as f:
-            return json.load(f)
+        with open('test_config.json', 'rb') as f:
+            return orjson.loads(f.read())
     except FileNotFoundError:
         logger.warning("Test config file not found, using defaults")
         return {
@@ -50,13 +105,17 @@ def test_playwright_scraping():
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
+        page.route("**/*", block_unneeded_requests)
         
         try:
             logger.info(f"Navigating to {category['url']}")
-            page.goto(category['url'], wait_until="networkidle")
+            page.goto(category['url'], wait_until="domcontentloaded")
             
-            # Wait a bit for any dynamic content to load
-            page.wait_for_timeout(5000)
+            # Wait until any of the candidate product containers is in the DOM
+            try:
+                page.wait_for_selector(", ".join(PRODUCT_CONTAINER_SELECTORS), state="attached", timeout=15000)
+            except Exception as e:
+                logger.warning(f"Timeout waiting for product elements: {str(e)}")
             
             # Get the page title
             title = page.title()
@@ -68,81 +127,22 @@ def test_playwright_scraping():
             
             # Examine the DOM structure to help find proper selectors
             # Find product containers using JavaScript (more reliable for dynamic sites)
-            products_count = page.evaluate("""
-                () => {
-                    // Try different common selectors for product grids
-                    const selectors = [
-                        '.product-item', '.product-card', 
-                        '[data-test="product-item"]', '.product',
-                        '.product-grid-item', '.set-item', 
-                        'article', '.ProductGridItem__Container', 
-                        '[data-test="product-leaf"]'
-                    ];
-                    
-                    for (const selector of selectors) {
-                        const elements = document.querySelectorAll(selector);
-                        if (elements.length > 0) {
-                            console.log('Found products with selector:', selector);
-                            return {selector: selector, count: elements.length};
-                        }
-                    }
-                    
-                    return {selector: null, count: 0};
-                }
-            """)
+            products_count = page.evaluate(_FIND_PRODUCTS_JS, PRODUCT_CONTAINER_SELECTORS)
             
             logger.info(f"Found {products_count['count']} products with selector: {products_count['selector']}")
             
             # If products were found, extract some basic info
             if products_count['count'] > 0 and products_count['selector']:
-                product_info = page.evaluate(f"""
-                    () => {{
-                        const selector = '{products_count['selector']}';
-                        const products = document.querySelectorAll(selector);
-                        const results = [];
-                        
-                        // Get the first 3 products
-                        const limit = Math.min(3, products.length);
-                        
-                        for (let i = 0; i < limit; i++) {{
-                            const product = products[i];
-                            
-                            // Try to find name
-                            let name = '';
-                            const nameSelectors = ['.product-name', '.name', 'h2', 'h3', '[data-test="product-title"]', '.title'];
-                            for (const s of nameSelectors) {{
-                                const el = product.querySelector(s);
-                                if (el && el.textContent.trim()) {{
-                                    name = el.textContent.trim();
-                                    break;
-                                }}
-                            }}
-                            
-                            // Try to find price
-                            let price = '';
-                            const priceSelectors = ['.price', '.product-price', '[data-test="price"]', '[data-test="product-price"]'];
-                            for (const s of priceSelectors) {{
-                                const el = product.querySelector(s);
-                                if (el && el.textContent.trim()) {{
-                                    price = el.textContent.trim();
-                                    break;
-                                }}
-                            }}
-                            
-                            results.push({{ name, price }});
-                        }}
-                        
-                        return results;
-                    }}
-                """)
+                product_info = page.evaluate(
+                    _EXTRACT_PRODUCT_INFO_JS,
+                    [products_count['selector'], NAME_SELECTORS, PRICE_SELECTORS, 3]
+                )
                 
                 for i, product in enumerate(product_info):
                     logger.info(f"Product {i+1}: {product.get('name', 'Unknown')} - {product.get('price', 'Unknown')}")
             
         except Exception as e:
-            logger.error(f"Error during scraping: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error during scraping: %s", e)
         finally:
             browser.close()
 
@@ -3,14 +3,17 @@
 URL Test Script - Tests if a specific LEGO URL is accessible and can be scraped
 """
 
+import asyncio
 import logging
 import sys
 import os
 import time
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
 import json
+from blocking_helpers import async_request_blocker
 
 # Configure logging
 logging.basicConfig(
@@ -26,12 +29,53 @@ logger = logging.getLogger(__name__)
 # Create log directory if it doesn't exist
 os.makedirs("logs", exist_ok=True)
 
+# Stylesheets are kept so the saved screenshot still shows the page layout
+block_unneeded_requests = async_request_blocker()
+
+# Common selectors for product grids, tried in order
+PRODUCT_CONTAINER_SELECTORS = [
+    '.product-item', '.product-card',
+    '[data-test="product-item"]', '.product',
+    '.product-grid-item', '.set-item',
+    'article', '.ProductGridItem__Container',
+    '[data-test="product-leaf"]'
+]
+
+# Runs in the page: returns the first container selector that matches anything
+_FIND_PRODUCTS_JS = """
+(selectors) => {
+    for (const selector of selectors) {
+        const elements = document.querySelectorAll(selector);
+        if (elements.length > 0) {
+            return {selector: selector, count: elements.length};
+        }
+    }
+    
+    return {selector: null, count: 0};
+}
+"""
+
+# Keep-alive session shared by the accessibility and redirect probes, which
+# mostly hit the same host
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+def probe_url(url, allow_redirects):
+    """Request only the headers of a URL, falling back to GET if HEAD is not allowed."""
+    response = _session.head(url, allow_redirects=allow_redirects, timeout=10)
+    if response.status_code in (405, 501):
+        # stream=True stops requests from downloading the body
+        response = _session.get(url, allow_redirects=allow_redirects, timeout=10, stream=True)
+        response.close()
+    return response
+
 def test_url(url):
     """Test if a URL is accessible using requests."""
     logger.info(f"Testing URL accessibility with requests: {url}")
     
     try:
-        response = requests.get(url, timeout=10)
+        response = probe_url(url, allow_redirects=True)
         logger.info(f"Response status code: {response.status_code}")
         
         if response.status_code == 200:
@@ -49,7 +93,7 @@ def check_url_redirect(url):
     logger.info(f"Checking for redirects: {url}")
     
     try:
-        response = requests.get(url, allow_redirects=False, timeout=10)
+        response = probe_url(url, allow_redirects=False)
         
         if response.status_code in (301, 302, 303, 307, 308):
             redirect_url = response.headers.get('Location')
@@ -69,82 +113,61 @@ def check_url_redirect(url):
         logger.error(f"Error checking redirects: {str(e)}")
         return None
 
-def test_url_with_playwright(url):
-    """Test if a URL is accessible using Playwright."""
+async def test_url_with_playwright(url, browser, inspect_page=True):
+    """Test if a URL is accessible using Playwright, in a fresh context of the shared browser.
+    
+    With inspect_page=False only the status and title are checked, so the page's
+    JavaScript is disabled and no screenshot, product probe or HTML dump is made.
+    """
     logger.info(f"Testing URL with Playwright: {url}")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    context = await browser.new_context(java_script_enabled=inspect_page)
+    await context.route("**/*", block_unneeded_requests)
+    page = await context.new_page()
+    
+    try:
+        logger.info(f"Navigating to: {url}")
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
         
-        try:
-            logger.info(f"Navigating to: {url}")
-            response = page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        if response:
+            logger.info(f"Playwright response status: {response.status}")
             
-            if response:
-                logger.info(f"Playwright response status: {response.status}")
-                
-                # Take a screenshot for verification
-                screenshot_path = "data/url_test_screenshot.png"
-                page.screenshot(path=screenshot_path)
-                logger.info(f"Screenshot saved to: {screenshot_path}")
-                
-                # Get the final URL (after any client-side redirects)
-                final_url = page.url
-                logger.info(f"Final URL after any client-side redirects: {final_url}")
-                
-                # Get page title
-                title = page.title()
-                logger.info(f"Page title: {title}")
-                
-                # Check for common LEGO page elements
-                page.wait_for_timeout(5000)  # Wait for any dynamic content to load
-                
-                # Try to detect LEGO products on the page
-                product_info = page.evaluate("""
-                    () => {
-                        // Try different common selectors for product grids
-                        const selectors = [
-                            '.product-item', '.product-card', 
-                            '[data-test="product-item"]', '.product',
-                            '.product-grid-item', '.set-item', 
-                            'article', '.ProductGridItem__Container', 
-                            '[data-test="product-leaf"]'
-                        ];
-                        
-                        for (const selector of selectors) {
-                            const elements = document.querySelectorAll(selector);
-                            if (elements.length > 0) {
-                                return {
-                                    selector: selector, 
-                                    count: elements.length
-                                };
-                            }
-                        }
-                        
-                        return {selector: null, count: 0};
-                    }
-                """)
-                
-                logger.info(f"Product detection: {product_info}")
-                
-                html_content = page.content()
-                with open("data/page_content.html", "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                logger.info("Saved page content to data/page_content.html")
-                
+            # Get the final URL (after any client-side redirects)
+            final_url = page.url
+            logger.info(f"Final URL after any client-side redirects: {final_url}")
+            
+            # Get page title
+            title = await page.title()
+            logger.info(f"Page title: {title}")
+            
+            if not inspect_page:
                 return True
-            else:
-                logger.error("No response received from Playwright")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error accessing URL with Playwright: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            
+            # Take a screenshot for verification
+            screenshot_path = "data/url_test_screenshot.png"
+            await page.screenshot(path=screenshot_path)
+            logger.info(f"Screenshot saved to: {screenshot_path}")
+            
+            # Try to detect LEGO products on the page
+            product_info = await page.evaluate(_FIND_PRODUCTS_JS, PRODUCT_CONTAINER_SELECTORS)
+            
+            logger.info(f"Product detection: {product_info}")
+            
+            html_content = await page.content()
+            with open("data/page_content.html", "w", encoding="utf-8") as f:
+                f.write(html_content)
+            logger.info("Saved page content to data/page_content.html")
+            
+            return True
+        else:
+            logger.error("No response received from Playwright")
             return False
-        finally:
-            browser.close()
+            
+    except Exception as e:
+        logger.exception("Error accessing URL with Playwright: %s", e)
+        return False
+    finally:
+        await context.close()
 
 def suggest_alternative_urls(url):
     """Suggest alternative URLs based on the original URL."""
@@ -167,7 +190,25 @@ def suggest_alternative_urls(url):
     logger.info(f"Alternative URLs to try: {alternatives}")
     return alternatives
 
-def main():
+async def test_alternative_url(alt_url, browser):
+    """Check an alternative URL, only starting a browser page if requests cannot reach it."""
+    logger.info(f"Testing alternative URL: {alt_url}")
+    # requests is blocking, so its probe runs in a worker thread
+    alt_accessible = await asyncio.to_thread(test_url, alt_url)
+    
+    # A plain request is far cheaper than a page load; None means not checked
+    alt_accessible_playwright = None
+    if not alt_accessible:
+        # Alternatives only need to be reachable, so skip their JavaScript
+        alt_accessible_playwright = await test_url_with_playwright(alt_url, browser, inspect_page=False)
+    
+    return {
+        "url": alt_url,
+        "is_accessible": alt_accessible,
+        "is_accessible_playwright": alt_accessible_playwright
+    }
+
+async def main():
     # Create data directory if it doesn't exist
     os.makedirs("data", exist_ok=True)
     
@@ -181,40 +222,52 @@ def main():
     # Check for redirects
     redirect_url = check_url_redirect(url)
     
-    # Test with Playwright
-    is_accessible_playwright = test_url_with_playwright(url)
-    
-    # If both tests fail, suggest alternatives
-    if not is_accessible and not is_accessible_playwright:
-        logger.warning("URL is not accessible with either method. Suggesting alternatives.")
-        alternative_urls = suggest_alternative_urls(url)
+    # One browser is shared by every Playwright check; each gets its own context
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=True,
+            args=["--disable-gpu", "--disable-dev-shm-usage"]
+        )
         
-        results = {
-            "original_url": url,
-            "is_accessible": is_accessible,
-            "redirect_url": redirect_url,
-            "is_accessible_playwright": is_accessible_playwright,
-            "alternative_urls": []
-        }
-        
-        # Test alternative URLs
-        for alt_url in alternative_urls:
-            logger.info(f"Testing alternative URL: {alt_url}")
-            alt_accessible = test_url(alt_url)
-            alt_accessible_playwright = test_url_with_playwright(alt_url)
+        try:
+            # Test with Playwright
+            is_accessible_playwright = await test_url_with_playwright(url, browser)
             
-            results["alternative_urls"].append({
-                "url": alt_url,
-                "is_accessible": alt_accessible,
-                "is_accessible_playwright": alt_accessible_playwright
-            })
-        
-        # Save test results
-        with open("data/url_test_results.json", "w") as f:
-            json.dump(results, f, indent=2)
-        logger.info("Test results saved to data/url_test_results.json")
+            # If both tests fail, suggest alternatives
+            if not is_accessible and not is_accessible_playwright:
+                logger.warning("URL is not accessible with either method. Suggesting alternatives.")
+                alternative_urls = suggest_alternative_urls(url)
+                
+                results = {
+                    "original_url": url,
+                    "is_accessible": is_accessible,
+                    "redirect_url": redirect_url,
+                    "is_accessible_playwright": is_accessible_playwright,
+                    "alternative_urls": []
+                }
+                
+                # Test alternative URLs concurrently and stop at the first one that works
+                tasks = [asyncio.create_task(test_alternative_url(alt_url, browser)) for alt_url in alternative_urls]
+                try:
+                    for next_result in asyncio.as_completed(tasks):
+                        alt_result = await next_result
+                        results["alternative_urls"].append(alt_result)
+                        if alt_result["is_accessible"] or alt_result["is_accessible_playwright"]:
+                            logger.info(f"Found working alternative URL: {alt_result['url']}")
+                            break
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                
+                # Save test results
+                with open("data/url_test_results.json", "w") as f:
+                    json.dump(results, f, indent=2)
+                logger.info("Test results saved to data/url_test_results.json")
+        finally:
+            await browser.close()
     
     logger.info("URL test completed")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
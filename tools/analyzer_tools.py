@@ -1,12 +1,15 @@
 from langchain.tools import BaseTool
 from typing import List, Dict, Any, Optional, Type
 from pydantic import BaseModel, Field
-import json
-from datetime import datetime
+from tools.json_utils import dumps, loads
+from datetime import datetime, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields ChangeDetectionTool does not report (price changes are handled separately)
+_IGNORED_CHANGE_KEYS = frozenset(("price", "id", "timestamp"))
+
 class PriceComparisonInput(BaseModel):
     current_data: str = Field(..., description="JSON string containing current product data")
     historical_data: str = Field(..., description="JSON string containing historical product data")
@@ -19,22 +22,22 @@ class PriceComparisonTool(BaseTool):
     
     def _run(self, current_data: str, historical_data: str, price_threshold: float = 0.0) -> str:
         try:
-            current_products = json.loads(current_data)
-            historical_products = json.loads(historical_data)
+            current_products = loads(current_data)
+            historical_products = loads(historical_data)
             
             # Create lookup dictionaries for faster comparison
-            current_dict = {p.get("id"): p for p in current_products if p.get("id")}
-            historical_dict = {p.get("id"): p for p in historical_products if p.get("id")}
+            current_dict = {pid: p for p in current_products if (pid := p.get("id"))}
+            historical_dict = {pid: p for p in historical_products if (pid := p.get("id"))}
             
             price_changes = []
             
             # Check each current product for price changes
+            get_price = self._get_price
             for product_id, current_product in current_dict.items():
-                if product_id in historical_dict:
-                    historical_product = historical_dict[product_id]
-                    
-                    current_price = self._get_price(current_product)
-                    historical_price = self._get_price(historical_product)
+                historical_product = historical_dict.get(product_id)
+                if historical_product is not None:
+                    current_price = get_price(current_product)
+                    historical_price = get_price(historical_product)
                     
                     if current_price is not None and historical_price is not None:
                         # Calculate price change
@@ -62,14 +65,14 @@ class PriceComparisonTool(BaseTool):
             result = {
                 "price_changes": price_changes,
                 "total_changes": len(price_changes),
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
             logger.error(f"Price comparison error: {e}")
-            return json.dumps({"error": f"Price comparison failed: {str(e)}"})
+            return dumps({"error": f"Price comparison failed: {str(e)}"})
     
     def _get_price(self, product: Dict[str, Any]) -> Optional[float]:
         """Extract price from product data safely"""
@@ -93,20 +96,21 @@ class ChangeDetectionTool(BaseTool):
     
     def _run(self, current_data: str, historical_data: str) -> str:
         try:
-            current_products = json.loads(current_data)
-            historical_products = json.loads(historical_data)
+            current_products = loads(current_data)
+            historical_products = loads(historical_data)
             
-            # Create sets of product IDs for quick comparison
-            current_ids = {p.get("id") for p in current_products if p.get("id")}
-            historical_ids = {p.get("id") for p in historical_products if p.get("id")}
+            # Index products by ID once
+            current_dict = {pid: p for p in current_products if (pid := p.get("id"))}
+            historical_dict = {pid: p for p in historical_products if (pid := p.get("id"))}
             
-            # Find new and removed products
-            new_ids = current_ids - historical_ids
-            removed_ids = historical_ids - current_ids
+            # Find new and removed products. Each side is walked once and probed against
+            # the other dict: a keys-view difference copies the left side into a new set
+            # and then walks the right side, however much larger it is.
+            new_ids = [pid for pid in current_dict if pid not in historical_dict]
+            removed_ids = [pid for pid in historical_dict if pid not in current_dict]
             
-            # Create lookups for detailed information
-            current_dict = {p.get("id"): p for p in current_products if p.get("id")}
-            historical_dict = {p.get("id"): p for p in historical_products if p.get("id")}
+            # One timestamp for the whole run rather than one per product
+            now = datetime.now(timezone.utc).isoformat()
             
             # Get detailed information about new products
             new_products = [
@@ -114,7 +118,7 @@ class ChangeDetectionTool(BaseTool):
                     "id": product_id,
                     "name": current_dict[product_id].get("name", "Unknown"),
                     "price": current_dict[product_id].get("price", 0),
-                    "detected_at": datetime.utcnow().isoformat()
+                    "detected_at": now
                 }
                 for product_id in new_ids
             ]
@@ -125,7 +129,7 @@ class ChangeDetectionTool(BaseTool):
                     "id": product_id,
                     "name": historical_dict[product_id].get("name", "Unknown"),
                     "last_price": historical_dict[product_id].get("price", 0),
-                    "removed_at": datetime.utcnow().isoformat(),
+                    "removed_at": now,
                     "last_seen": historical_dict[product_id].get("timestamp", "Unknown")
                 }
                 for product_id in removed_ids
@@ -133,25 +137,35 @@ class ChangeDetectionTool(BaseTool):
             
             # Detect other changes (excluding price changes)
             other_changes = []
-            for product_id in current_ids.intersection(historical_ids):
-                current = current_dict[product_id]
-                historical = historical_dict[product_id]
+            for product_id, current in current_dict.items():
+                historical = historical_dict.get(product_id)
+                if historical is None:
+                    continue
                 
                 changes = {}
-                for key in set(current.keys()).union(historical.keys()):
+                for key, current_value in current.items():
                     # Skip price as it's handled separately
-                    if key in ("price", "id", "timestamp"):
+                    if key in _IGNORED_CHANGE_KEYS:
                         continue
                     
-                    current_value = current.get(key)
                     historical_value = historical.get(key)
-                    
                     if current_value != historical_value:
                         changes[key] = {
                             "from": historical_value,
                             "to": current_value
                         }
                 
+                # Fields that only the historical record has
+                for key, historical_value in historical.items():
+                    if key in _IGNORED_CHANGE_KEYS or key in current:
+                        continue
+                    
+                    if historical_value is not None:
+                        changes[key] = {
+                            "from": historical_value,
+                            "to": None
+                        }
+                
                 if changes:
                     other_changes.append({
                         "id": product_id,
@@ -170,14 +184,14 @@ class ChangeDetectionTool(BaseTool):
                     "removed_products_count": len(removed_products),
                     "other_changes_count": len(other_changes)
                 },
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": now
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
             logger.error(f"Change detection error: {e}")
-            return json.dumps({"error": f"Change detection failed: {str(e)}"})
+            return dumps({"error": f"Change detection failed: {str(e)}"})
 
 # Instantiate the tools
 price_comparison_tool = PriceComparisonTool()
@@ -0,0 +1,25 @@
+"""JSON helpers shared by the tools, backed by orjson when it is installed."""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(obj, indent: bool = False) -> str:
+    """Serialize obj to a JSON string, pretty-printed with two spaces if indent is set."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    if indent:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(",", ":"))
+
+def loads(data):
+    """Parse a JSON string or bytes. Already-decoded dicts and lists are returned
+    unchanged, so a tool called in-process with another tool's data skips the round-trip."""
+    if isinstance(data, (dict, list)):
+        return data
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -3,16 +3,125 @@ from typing import Optional, Type, List, Dict, Any
 from pydantic import BaseModel, Field
 import requests
 from bs4 import BeautifulSoup
+import soupsieve as sv
 from playwright.sync_api import sync_playwright
 import time
 import random
 import logging
 import re
-import json
+from tools.json_utils import dumps, loads
 import os
+import atexit
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# lxml's C parser is much faster than the pure-Python html.parser; fall back to
+# the latter only where lxml is not installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Products extracted per (HTML digest, category, URL, selectors), most recently used last
+EXTRACTION_CACHE_SIZE = 128
+_extraction_cache = OrderedDict()
+_extraction_cache_lock = threading.Lock()
+
+def _extraction_cache_key(html_content: str, category_name: str, url: str, selectors: tuple) -> tuple:
+    # Identical pages (e.g. unchanged between scrape intervals) are only parsed once
+    return (
+        hashlib.blake2b(html_content.encode("utf-8"), digest_size=16).digest(),
+        category_name,
+        url,
+        selectors
+    )
+
+def _get_cached_products(cache_key: tuple) -> Optional[List[Dict[str, Any]]]:
+    with _extraction_cache_lock:
+        products = _extraction_cache.get(cache_key)
+        if products is not None:
+            _extraction_cache.move_to_end(cache_key)
+    return products
+
+def _store_cached_products(cache_key: tuple, products: List[Dict[str, Any]]) -> None:
+    with _extraction_cache_lock:
+        _extraction_cache[cache_key] = products
+        if len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+            _extraction_cache.popitem(last=False)
+
+# Selectors from the config are the same on every call, so compile each one once
+@functools.lru_cache(maxsize=64)
+def _compile_selector(selector: str):
+    return sv.compile(selector)
+
+# Patterns used per product, compiled once at import
+_PRICE_RE = re.compile(r'(\d+(?:\.\d+)?)')
+_PRICE_SEPARATORS = str.maketrans({'.': None, ',': '.'})
+_SET_FROM_URL_RE = re.compile(r'/products?/([a-zA-Z0-9-]+)')
+_DIGITS_RE = re.compile(r'(\d+)')
+_ID_ATTR_RE = re.compile(r'item|product|set', re.IGNORECASE)
+_CURRENCY_SYMBOL_RE = re.compile(r'[₺€$£¥]')
+_CURRENCY_CODE_RE = re.compile(r'TRY|TL|EUR|USD|GBP')
+_CURRENCY_SYMBOLS = {
+    '₺': 'TRY',  # Turkish Lira
+    '€': 'EUR',  # Euro
+    '$': 'USD',  # US Dollar
+    '£': 'GBP',  # British Pound
+    '¥': 'JPY',  # Japanese Yen
+}
+
+# Fixed fallback selectors used for every product, compiled once at import
+_NAME_FALLBACK_SELECTOR = sv.compile("[data-test='product-title'], [data-product-name], .name, .title")
+_PRICE_FALLBACK_SELECTOR = sv.compile("[data-test='product-price'], [data-product-price], .price")
+_PRODUCT_LINK_SELECTOR = sv.compile("a[href*='/products/'], a[href*='/product/']")
+_SET_NUMBER_SELECTOR = sv.compile("[data-test='product-number'], .product-number, .set-number")
+_IMAGE_FALLBACK_SELECTOR = sv.compile("img[data-test='product-image'], img.product-image, img.main-image")
+_AVAILABILITY_SELECTOR = sv.compile("[data-test='product-availability'], .availability, .product-availability")
+_BADGE_SELECTOR = sv.compile(".product-badge, .product-flag, [data-test='product-flag']")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36"
+
+# Shared HTTP session so plain (non-JavaScript) fetches reuse keep-alive connections
+_http_session = requests.Session()
+_http_session.headers.update({"User-Agent": USER_AGENT})
+
+# Launching Chromium takes about a second, so each thread keeps its Playwright
+# driver and browser between calls. Sync Playwright objects cannot be shared
+# across threads, hence one browser per thread rather than a global one.
+_browser_local = threading.local()
+
+def _get_browser():
+    """Return this thread's headless browser, launching it on first use"""
+    browser = getattr(_browser_local, "browser", None)
+    if browser is None or not browser.is_connected():
+        if getattr(_browser_local, "playwright", None) is None:
+            _browser_local.playwright = sync_playwright().start()
+            if threading.current_thread() is threading.main_thread():
+                atexit.register(close_browser)
+        browser = _browser_local.playwright.chromium.launch(headless=True)
+        _browser_local.browser = browser
+    return browser
+
+def close_browser():
+    """Close this thread's browser and stop its Playwright driver, if they were started"""
+    browser = getattr(_browser_local, "browser", None)
+    playwright = getattr(_browser_local, "playwright", None)
+    _browser_local.browser = None
+    _browser_local.playwright = None
+    try:
+        if browser is not None and browser.is_connected():
+            browser.close()
+    except Exception as e:
+        logger.warning(f"Error closing browser: {e}")
+    finally:
+        if playwright is not None:
+            playwright.stop()
+
 class LegoWebNavigationInput(BaseModel):
     url: str = Field(..., description="The URL of the LEGO website to navigate to")
     category_name: str = Field("Uncategorized", description="The name of the LEGO category being scraped")
@@ -34,16 +143,29 @@ class LegoWebNavigationTool(BaseTool):
         max_pages: int = 5
     ) -> str:
         logger.info(f"Navigating to LEGO {category_name} category: {url} with max_pages={max_pages}")
+        
+        # A plain HTTP fetch is far cheaper than a headless browser when the listing is
+        # rendered server-side; fall back to the browser if it yields no products
+        if not use_javascript:
+            html = self._fetch_without_javascript(url, category_name)
+            if html:
+                return dumps({
+                    "category_name": category_name,
+                    "url": url,
+                    "pages_scraped": 1,
+                    "html_content": html
+                })
+            logger.info(f"No products in plain HTML for LEGO {category_name}, falling back to JavaScript rendering")
+        
         all_html = []
         
         # For LEGO website, we should always use JavaScript rendering as it's a heavily JS-based site
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
-                viewport={"width": 1920, "height": 1080}
-            )
-            
+        # The browser is kept between calls; only the context is created per call
+        context = _get_browser().new_context(
+            user_agent=USER_AGENT,
+            viewport={"width": 1920, "height": 1080}
+        )
+        try:
             # Add cookie consent handling
             page = context.new_page()
             page.goto(url)
@@ -76,6 +198,11 @@ class LegoWebNavigationTool(BaseTool):
             # LEGO sites typically use "Load More" buttons or traditional pagination
             current_page = 1
             
+            # "Load More" keeps every earlier product in the page, so rather than a
+            # snapshot per click, the page's snapshot is retaken once after the last
+            # click or before navigating away from it
+            load_more_pending = False
+            
             while current_page < max_pages:
                 # Try to find "Load More" button first (common on LEGO sites)
                 load_more_button = None
@@ -94,7 +221,7 @@ class LegoWebNavigationTool(BaseTool):
                         page.wait_for_load_state("networkidle")
                         # Wait a bit more to ensure products are rendered
                         time.sleep(2)
-                        all_html.append(page.content())
+                        load_more_pending = True
                         current_page += 1
                     except Exception as e:
                         logger.error(f"Error clicking 'Load More' button on {category_name} page: {e}")
@@ -106,6 +233,9 @@ class LegoWebNavigationTool(BaseTool):
                             "a[data-test='pagination-next'], .pagination__next, .Paginationstyles__NextButton-*"
                         )
                         if next_button:
+                            if load_more_pending:
+                                all_html[-1] = page.content()
+                                load_more_pending = False
                             next_button.click()
                             logger.info(f"Clicked pagination 'Next' button on {category_name} page")
                             page.wait_for_load_state("networkidle")
@@ -121,17 +251,46 @@ class LegoWebNavigationTool(BaseTool):
                 # Random delay to avoid detection
                 time.sleep(random.uniform(1, 3))
             
-            browser.close()
+            if load_more_pending:
+                all_html[-1] = page.content()
+        finally:
+            context.close()
         
         # Return HTML content with category metadata
         result = {
             "category_name": category_name,
             "url": url,
-            "pages_scraped": len(all_html),
+            "pages_scraped": current_page,
             "html_content": "\n".join(all_html)
         }
         
-        return json.dumps(result)
+        return dumps(result)
+    
+    def _fetch_without_javascript(self, url: str, category_name: str) -> Optional[str]:
+        """Fetch the page over plain HTTP; returns None if it has no product elements"""
+        try:
+            response = _http_session.get(url, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Plain HTTP fetch failed for LEGO {category_name} page: {e}")
+            return None
+        
+        # Decode explicitly instead of using response.text: without a charset in the
+        # Content-Type header that falls back to slow encoding detection. LEGO pages
+        # are UTF-8, and handing a str downstream keeps BeautifulSoup from sniffing too.
+        content_type = response.headers.get("Content-Type", "").lower()
+        encoding = response.encoding if "charset=" in content_type else "utf-8"
+        try:
+            html = response.content.decode(encoding, errors="replace")
+        except LookupError:
+            # Unknown or misspelled charset in the header
+            logger.warning(f"Unknown charset '{encoding}' for LEGO {category_name} page, decoding as UTF-8")
+            html = response.content.decode("utf-8", errors="replace")
+        
+        # A substring check is enough here and avoids parsing the page twice
+        if "product-item" not in html and "product-card" not in html:
+            return None
+        return html
 
 class LegoDataExtractionInput(BaseModel):
     category_data: str = Field(..., description="JSON string containing category metadata and HTML content")
@@ -159,148 +318,15 @@ class LegoDataExtractionTool(BaseTool):
     ) -> str:
         try:
             # Parse the category data
-            category_info = json.loads(category_data)
+            category_info = loads(category_data)
             category_name = category_info.get("category_name", "Uncategorized")
             url = category_info.get("url", "")
             html_content = category_info.get("html_content", "")
             
             logger.info(f"Extracting product data from LEGO {category_name} category")
             
-            soup = BeautifulSoup(html_content, "html.parser")
-            products = []
-            seen_ids = set()  # To avoid duplicates from multiple pages
-            
-            product_elements = soup.select(product_selector)
-            logger.info(f"Found {len(product_elements)} LEGO product elements in {category_name} category")
-            
-            for product_element in product_elements:
-                product = {
-                    "category": category_name,
-                    "category_url": url
-                }
-                
-                # Extract product name
-                if name_selector:
-                    name_element = product_element.select_one(name_selector)
-                    if name_element:
-                        product["name"] = name_element.text.strip()
-                
-                # Try alternative methods to find name if selector didn't work
-                if "name" not in product:
-                    # Try common attribute patterns for LEGO sites
-                    for element in product_element.select("[data-test='product-title'], [data-product-name], .name, .title"):
-                        if element.text.strip():
-                            product["name"] = element.text.strip()
-                            break
-                
-                # Extract price
-                if price_selector:
-                    price_element = product_element.select_one(price_selector)
-                    if price_element:
-                        price_text = price_element.text.strip()
-                        # Clean price (remove currency symbols, etc.)
-                        product["price"] = self._clean_price(price_text)
-                        product["price_raw"] = price_text
-                        product["currency"] = self._extract_currency(price_text)
-                
-                # Try alternative methods to find price
-                if "price" not in product:
-                    # Try common price patterns for LEGO sites
-                    for element in product_element.select("[data-test='product-price'], [data-product-price], .price"):
-                        if element.text.strip():
-                            price_text = element.text.strip()
-                            product["price"] = self._clean_price(price_text)
-                            product["price_raw"] = price_text
-                            product["currency"] = self._extract_currency(price_text)
-                            break
-                
-                # Extract product ID (set number for LEGO)
-                if id_selector:
-                    id_element = product_element.select_one(id_selector)
-                    if id_element:
-                        product["id"] = id_element.text.strip()
-                
-                # Try to extract set number from various attributes and patterns
-                if "id" not in product:
-                    # Look for set number in data attributes
-                    for attr in product_element.attrs:
-                        if "item" in attr.lower() or "product" in attr.lower() or "set" in attr.lower():
-                            product["id"] = product_element[attr]
-                            break
-                    
-                    # Try to extract from URL
-                    link_element = product_element.select_one("a[href*='/products/'], a[href*='/product/']")
-                    if link_element and link_element.has_attr("href"):
-                        href = link_element["href"]
-                        # LEGO product URLs often contain the set number
-                        set_match = re.search(r'/products?/([a-zA-Z0-9-]+)', href)
-                        if set_match:
-                            product["id"] = set_match.group(1)
-                    
-                    # Check for product number in text
-                    for element in product_element.select("[data-test='product-number'], .product-number, .set-number"):
-                        if element.text.strip():
-                            # Extract digits from text like "Item #10997" or "Set 10997"
-                            set_match = re.search(r'(\d+)', element.text)
-                            if set_match:
-                                product["id"] = set_match.group(1)
-                                break
-                
-                # Extract image URL
-                if image_selector:
-                    image_element = product_element.select_one(image_selector)
-                    if image_element and image_element.has_attr("src"):
-                        product["image_url"] = image_element["src"]
-                    elif image_element and image_element.has_attr("data-src"):
-                        product["image_url"] = image_element["data-src"]
-                
-                # Try alternative methods to find image
-                if "image_url" not in product:
-                    # Look for common image patterns
-                    for img in product_element.select("img[data-test='product-image'], img.product-image, img.main-image"):
-                        if img.has_attr("src") and img["src"]:
-                            product["image_url"] = img["src"]
-                            break
-                        elif img.has_attr("data-src") and img["data-src"]:
-                            product["image_url"] = img["data-src"]
-                            break
-                
-                # Extract description if available (not always present on listing pages)
-                if description_selector:
-                    desc_element = product_element.select_one(description_selector)
-                    if desc_element:
-                        product["description"] = desc_element.text.strip()
-                
-                # Extract availability information
-                availability_element = product_element.select_one(
-                    "[data-test='product-availability'], .availability, .product-availability"
-                )
-                if availability_element:
-                    product["availability"] = availability_element.text.strip()
-                
-                # Extract any promotional or "New" badges
-                badges = []
-                for badge in product_element.select(".product-badge, .product-flag, [data-test='product-flag']"):
-                    badges.append(badge.text.strip())
-                if badges:
-                    product["badges"] = badges
-                
-                # Extract product URL for direct linking
-                product_link = product_element.select_one("a[href*='/products/'], a[href*='/product/']")
-                if product_link and product_link.has_attr("href"):
-                    href = product_link["href"]
-                    if href.startswith("/"):
-                        base_url = "https://lego.tr"
-                        product["url"] = base_url + href
-                    else:
-                        product["url"] = href
-                
-                # Add product if we have at least a name or ID and it's not a duplicate
-                product_id = product.get("id", "")
-                if (product.get("name") or product_id) and product_id not in seen_ids:
-                    if product_id:
-                        seen_ids.add(product_id)
-                    products.append(product)
+            selectors = (product_selector, name_selector, price_selector, id_selector, image_selector, description_selector)
+            products = self._cached_extract_products(html_content, category_name, url, selectors)
             
             # Add additional metadata
             result = {
@@ -311,36 +337,206 @@ class LegoDataExtractionTool(BaseTool):
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
             logger.error(f"Error extracting LEGO product data: {e}")
-            return json.dumps({
+            return dumps({
                 "error": str(e),
                 "category": category_info.get("category_name", "Unknown") if 'category_info' in locals() else "Unknown",
                 "products": [],
                 "total_products": 0
             })
     
+    def _cached_extract_products(
+        self,
+        html_content: str,
+        category_name: str,
+        url: str,
+        selectors: tuple
+    ) -> List[Dict[str, Any]]:
+        """Extract products, reusing the result for HTML that has already been parsed"""
+        cache_key = _extraction_cache_key(html_content, category_name, url, selectors)
+        products = _get_cached_products(cache_key)
+        if products is None:
+            products = self._extract_products(html_content, category_name, url, *selectors)
+            _store_cached_products(cache_key, products)
+        else:
+            logger.info(f"Reusing extracted products for unchanged LEGO {category_name} HTML")
+        return products
+    
+    def _extract_products(
+        self,
+        html_content: str,
+        category_name: str,
+        url: str,
+        product_selector: str,
+        name_selector: Optional[str],
+        price_selector: Optional[str],
+        id_selector: Optional[str],
+        image_selector: Optional[str],
+        description_selector: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Parse the HTML content and extract the LEGO products it contains"""
+        soup = BeautifulSoup(html_content, HTML_PARSER)
+        products = []
+        seen_ids = set()  # To avoid duplicates from multiple pages
+        
+        name_sel = _compile_selector(name_selector) if name_selector else None
+        price_sel = _compile_selector(price_selector) if price_selector else None
+        id_sel = _compile_selector(id_selector) if id_selector else None
+        image_sel = _compile_selector(image_selector) if image_selector else None
+        description_sel = _compile_selector(description_selector) if description_selector else None
+        
+        product_elements = _compile_selector(product_selector).select(soup)
+        logger.info(f"Found {len(product_elements)} LEGO product elements in {category_name} category")
+        
+        for product_element in product_elements:
+            product = {
+                "category": category_name,
+                "category_url": url
+            }
+            
+            # Extract product name
+            if name_sel is not None:
+                name_element = name_sel.select_one(product_element)
+                if name_element:
+                    product["name"] = name_element.text.strip()
+            
+            # Try alternative methods to find name if selector didn't work
+            if "name" not in product:
+                # Try common attribute patterns for LEGO sites
+                for element in _NAME_FALLBACK_SELECTOR.iselect(product_element):
+                    name_text = element.text.strip()
+                    if name_text:
+                        product["name"] = name_text
+                        break
+            
+            # Extract price
+            if price_sel is not None:
+                price_element = price_sel.select_one(product_element)
+                if price_element:
+                    price_text = price_element.text.strip()
+                    # Clean price (remove currency symbols, etc.)
+                    product["price"] = self._clean_price(price_text)
+                    product["price_raw"] = price_text
+                    product["currency"] = self._extract_currency(price_text)
+            
+            # Try alternative methods to find price
+            if "price" not in product:
+                # Try common price patterns for LEGO sites
+                for element in _PRICE_FALLBACK_SELECTOR.iselect(product_element):
+                    price_text = element.text.strip()
+                    if price_text:
+                        product["price"] = self._clean_price(price_text)
+                        product["price_raw"] = price_text
+                        product["currency"] = self._extract_currency(price_text)
+                        break
+            
+            # Extract product ID (set number for LEGO)
+            if id_sel is not None:
+                id_element = id_sel.select_one(product_element)
+                if id_element:
+                    product["id"] = id_element.text.strip()
+            
+            # The product link gives both a set number fallback and the product URL
+            product_link = _PRODUCT_LINK_SELECTOR.select_one(product_element)
+            
+            # Try to extract set number from various attributes and patterns
+            if "id" not in product:
+                # Look for set number in data attributes
+                for attr in product_element.attrs:
+                    if _ID_ATTR_RE.search(attr):
+                        product["id"] = product_element[attr]
+                        break
+                
+                # Try to extract from URL
+                if product_link and product_link.has_attr("href"):
+                    href = product_link["href"]
+                    # LEGO product URLs often contain the set number
+                    set_match = _SET_FROM_URL_RE.search(href)
+                    if set_match:
+                        product["id"] = set_match.group(1)
+                
+                # Check for product number in text
+                for element in _SET_NUMBER_SELECTOR.iselect(product_element):
+                    number_text = element.text
+                    if number_text.strip():
+                        # Extract digits from text like "Item #10997" or "Set 10997"
+                        set_match = _DIGITS_RE.search(number_text)
+                        if set_match:
+                            product["id"] = set_match.group(1)
+                            break
+            
+            # Extract image URL
+            if image_sel is not None:
+                image_element = image_sel.select_one(product_element)
+                if image_element and image_element.has_attr("src"):
+                    product["image_url"] = image_element["src"]
+                elif image_element and image_element.has_attr("data-src"):
+                    product["image_url"] = image_element["data-src"]
+            
+            # Try alternative methods to find image
+            if "image_url" not in product:
+                # Look for common image patterns
+                for img in _IMAGE_FALLBACK_SELECTOR.iselect(product_element):
+                    if img.has_attr("src") and img["src"]:
+                        product["image_url"] = img["src"]
+                        break
+                    elif img.has_attr("data-src") and img["data-src"]:
+                        product["image_url"] = img["data-src"]
+                        break
+            
+            # Extract description if available (not always present on listing pages)
+            if description_sel is not None:
+                desc_element = description_sel.select_one(product_element)
+                if desc_element:
+                    product["description"] = desc_element.text.strip()
+            
+            # Extract availability information
+            availability_element = _AVAILABILITY_SELECTOR.select_one(product_element)
+            if availability_element:
+                product["availability"] = availability_element.text.strip()
+            
+            # Extract any promotional or "New" badges
+            badges = [badge.text.strip() for badge in _BADGE_SELECTOR.iselect(product_element)]
+            if badges:
+                product["badges"] = badges
+            
+            # Extract product URL for direct linking
+            if product_link and product_link.has_attr("href"):
+                href = product_link["href"]
+                if href.startswith("/"):
+                    base_url = "https://lego.tr"
+                    product["url"] = base_url + href
+                else:
+                    product["url"] = href
+            
+            # Add product if we have at least a name or ID and it's not a duplicate
+            product_id = product.get("id", "")
+            if (product.get("name") or product_id) and product_id not in seen_ids:
+                if product_id:
+                    seen_ids.add(product_id)
+                products.append(product)
+        
+        return products
+    
     def _clean_price(self, price_text: str) -> float:
         """Extract numeric price from text with currency symbols, etc."""
         # LEGO specific price cleaning
         if not price_text:
             return 0.0
             
-        # Convert Turkish Lira (₺) format if present
-        price_text = price_text.replace(".", "").replace(",", ".")
+        # Convert Turkish Lira (₺) format if present: drop thousands separators
+        # and turn the decimal comma into a point, in a single pass
+        price_text = price_text.translate(_PRICE_SEPARATORS)
         
         # Extract just the digits and decimal point
-        import re
         # Find the first price-like pattern
-        price_match = re.search(r'(\d+(?:[.,]\d+)?)', price_text)
+        price_match = _PRICE_RE.search(price_text)
         if price_match:
-            price_str = price_match.group(1)
-            # Handle both comma and period as decimal separators
-            price_str = price_str.replace(',', '.')
             try:
-                return float(price_str)
+                return float(price_match.group(1))
             except ValueError:
                 return 0.0
         return 0.0
@@ -350,25 +546,15 @@ class LegoDataExtractionTool(BaseTool):
         if not price_text:
             return ""
             
-        # Look for currency symbols
-        currency_map = {
-            '₺': 'TRY',  # Turkish Lira
-            '€': 'EUR',  # Euro
-            '$': 'USD',  # US Dollar
-            '£': 'GBP',  # British Pound
-            '¥': 'JPY',  # Japanese Yen
-        }
+        # Look for currency symbols first, then for currency codes
+        symbol_match = _CURRENCY_SYMBOL_RE.search(price_text)
+        if symbol_match:
+            return _CURRENCY_SYMBOLS[symbol_match.group(0)]
+        
+        code_match = _CURRENCY_CODE_RE.search(price_text)
+        if code_match:
+            return code_match.group(0)
         
-        for symbol, code in currency_map.items():
-            if symbol in price_text:
-                return code
-                
-        # If no symbol found, try to extract currency code
-        currency_codes = ['TRY', 'TL', 'EUR', 'USD', 'GBP']
-        for code in currency_codes:
-            if code in price_text:
-                return code
-                
         # Default for Turkish LEGO site
         return "TRY"
 
@@ -1,7 +1,7 @@
 from langchain.tools import BaseTool
 from typing import List, Dict, Any, Optional, Type
 from pydantic import BaseModel, Field
-import json
+from tools.json_utils import dumps, loads
 from datetime import datetime
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -10,6 +10,44 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Static parts of the default HTML email, built once at import
+_HTML_HEADER_START = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { background-color: #f8f9fa; padding: 10px; border-bottom: 1px solid #ddd; }
+                .section { margin-bottom: 20px; }
+                .price-up { color: #dc3545; }
+                .price-down { color: #28a745; }
+                table { border-collapse: collapse; width: 100%; }
+                th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
+                th { background-color: #f2f2f2; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h2>Price Monitoring Update</h2>
+                    <p>Generated on: """
+_HTML_HEADER_END = """</p>
+                </div>
+        """
+_HTML_TABLE_END = """
+                    </table>
+                </div>
+            """
+_HTML_FOOTER = """
+                <div class="footer">
+                    <p>This is an automated notification from your Price Monitoring System.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
 class EmailCompositionInput(BaseModel):
     price_changes: str = Field(..., description="JSON string containing price change data")
     product_changes: str = Field(..., description="JSON string containing product addition/removal data")
@@ -29,8 +67,8 @@ class EmailCompositionTool(BaseTool):
         email_template: Optional[str] = None
     ) -> str:
         try:
-            price_data = json.loads(price_changes)
-            product_data = json.loads(product_changes)
+            price_data = loads(price_changes)
+            product_data = loads(product_changes)
             
             # Extract relevant information
             price_changes_list = price_data.get("price_changes", [])
@@ -43,7 +81,7 @@ class EmailCompositionTool(BaseTool):
             has_removed_products = len(removed_products) > 0
             
             if not (has_price_changes or has_new_products or has_removed_products):
-                return json.dumps({
+                return dumps({
                     "email_required": False,
                     "reason": "No significant changes detected"
                 })
@@ -82,11 +120,11 @@ class EmailCompositionTool(BaseTool):
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
             logger.error(f"Email composition error: {e}")
-            return json.dumps({
+            return dumps({
                 "email_required": False,
                 "error": f"Email composition failed: {str(e)}"
             })
@@ -98,33 +136,15 @@ class EmailCompositionTool(BaseTool):
         removed_products: List[Dict[str, Any]]
     ) -> str:
         """Generate a default HTML email template"""
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-                .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-                .header { background-color: #f8f9fa; padding: 10px; border-bottom: 1px solid #ddd; }
-                .section { margin-bottom: 20px; }
-                .price-up { color: #dc3545; }
-                .price-down { color: #28a745; }
-                table { border-collapse: collapse; width: 100%; }
-                th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
-                th { background-color: #f2f2f2; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h2>Price Monitoring Update</h2>
-                    <p>Generated on: """ + datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC") + """</p>
-                </div>
-        """
+        parts = [
+            _HTML_HEADER_START,
+            datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+            _HTML_HEADER_END
+        ]
         
         # Price changes section
         if price_changes:
-            html += """
+            parts.append("""
                 <div class="section">
                     <h3>Price Changes</h3>
                     <table>
@@ -134,30 +154,30 @@ class EmailCompositionTool(BaseTool):
                             <th>New Price</th>
                             <th>Change</th>
                         </tr>
-            """
+            """)
             
             for change in price_changes:
                 price_class = "price-up" if change.get("change_type") == "increase" else "price-down"
+                product_name = change.get("product_name", "Unknown")
+                previous_price = change.get("previous_price", 0)
+                current_price = change.get("current_price", 0)
                 percent_change = change.get("percent_change", 0)
                 change_symbol = "+" if percent_change > 0 else ""
                 
-                html += f"""
+                parts.append(f"""
                         <tr>
-                            <td>{change.get("product_name", "Unknown")}</td>
-                            <td>${change.get("previous_price", 0):.2f}</td>
-                            <td>${change.get("current_price", 0):.2f}</td>
+                            <td>{product_name}</td>
+                            <td>${previous_price:.2f}</td>
+                            <td>${current_price:.2f}</td>
                             <td class="{price_class}">{change_symbol}{percent_change}%</td>
                         </tr>
-                """
+                """)
             
-            html += """
-                    </table>
-                </div>
-            """
+            parts.append(_HTML_TABLE_END)
         
         # New products section
         if new_products:
-            html += """
+            parts.append("""
                 <div class="section">
                     <h3>New Products</h3>
                     <table>
@@ -165,24 +185,23 @@ class EmailCompositionTool(BaseTool):
                             <th>Product</th>
                             <th>Price</th>
                         </tr>
-            """
+            """)
             
             for product in new_products:
-                html += f"""
+                product_name = product.get("name", "Unknown")
+                price = product.get("price", 0)
+                parts.append(f"""
                         <tr>
-                            <td>{product.get("name", "Unknown")}</td>
-                            <td>${product.get("price", 0):.2f}</td>
+                            <td>{product_name}</td>
+                            <td>${price:.2f}</td>
                         </tr>
-                """
+                """)
             
-            html += """
-                    </table>
-                </div>
-            """
+            parts.append(_HTML_TABLE_END)
         
         # Removed products section
         if removed_products:
-            html += """
+            parts.append("""
                 <div class="section">
                     <h3>Removed Products</h3>
                     <table>
@@ -190,31 +209,24 @@ class EmailCompositionTool(BaseTool):
                             <th>Product</th>
                             <th>Last Price</th>
                         </tr>
-            """
+            """)
             
             for product in removed_products:
-                html += f"""
+                product_name = product.get("name", "Unknown")
+                last_price = product.get("last_price", 0)
+                parts.append(f"""
                         <tr>
-                            <td>{product.get("name", "Unknown")}</td>
-                            <td>${product.get("last_price", 0):.2f}</td>
+                            <td>{product_name}</td>
+                            <td>${last_price:.2f}</td>
                         </tr>
-                """
+                """)
             
-            html += """
-                    </table>
-                </div>
-            """
+            parts.append(_HTML_TABLE_END)
         
-        html += """
-                <div class="footer">
-                    <p>This is an automated notification from your Price Monitoring System.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        parts.append(_HTML_FOOTER)
         
-        return html
+        # Joining once keeps the build linear in the size of the email
+        return "".join(parts)
     
     def _generate_text_content(
         self, 
@@ -282,8 +294,8 @@ class PriorityAssessmentTool(BaseTool):
         new_product_priority: str = "medium"
     ) -> str:
         try:
-            price_data = json.loads(price_changes)
-            product_data = json.loads(product_changes)
+            price_data = loads(price_changes)
+            product_data = loads(product_changes)
             
             # Extract relevant information
             price_changes_list = price_data.get("price_changes", [])
@@ -298,14 +310,15 @@ class PriorityAssessmentTool(BaseTool):
             
             # Assess price changes
             significant_price_changes = []
+            # Very significant price changes (>20% or configured threshold * 2)
+            high_priority_threshold = max(20.0, price_threshold * 2)
             for change in price_changes_list:
                 percent_change = abs(change.get("percent_change", 0))
                 
                 if percent_change >= price_threshold:
                     significant_price_changes.append(change)
                     
-                    # Very significant price changes (>20% or configured threshold * 2)
-                    if percent_change >= max(20.0, price_threshold * 2):
+                    if percent_change >= high_priority_threshold:
                         has_high_priority = True
                         high_priority_reasons.append(
                             f"Significant price change of {percent_change:.1f}% for {change.get('product_name')}"
@@ -358,11 +371,11 @@ class PriorityAssessmentTool(BaseTool):
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
             logger.error(f"Priority assessment error: {e}")
-            return json.dumps({
+            return dumps({
                 "priority": "medium",  # Default to medium on error
                 "error": f"Priority assessment failed: {str(e)}"
             })
@@ -1,9 +1,16 @@
 from langchain.tools import BaseTool
-from typing import List, Dict, Any, Optional, Type
+from typing import List, Dict, Any, Optional, Type, Tuple, Callable
 from pydantic import BaseModel, Field
-import json
+from tools.json_utils import dumps, loads
+import hashlib
 import re
-from datetime import datetime
+from datetime import datetime, timezone
+
+# First number in a price string, after commas have been turned into decimal points
+_PRICE_RE = re.compile(r'(\d+(?:\.\d+)?)')
+
+# Characters _clean_text removes from every product name
+_SPECIAL_CHARS_RE = re.compile(r'[^\w\s\-.,]')
 
 class DataNormalizationInput(BaseModel):
     raw_data: str = Field(..., description="JSON string containing raw product data")
@@ -20,47 +27,54 @@ class DataNormalizationTool(BaseTool):
     def _run(self, raw_data: str, expected_fields: List[str]) -> str:
         try:
             # Parse JSON data
-            products = json.loads(raw_data)
-            normalized_products = []
+            products = loads(raw_data)
+            return dumps(self._normalize_products(products, expected_fields))
+        
+        except Exception as e:
+            return dumps({"error": f"Normalization failed: {str(e)}"})
+    
+    def _normalize_products(self, products: List[Dict[str, Any]], expected_fields: List[str]) -> List[Dict[str, Any]]:
+        """Normalize a list of raw product dicts"""
+        normalized_products = []
+        
+        # All products in a batch share one collection time
+        collected_at = datetime.now(timezone.utc).isoformat()
+        
+        for product in products:
+            normalized_product = {}
             
-            for product in products:
-                normalized_product = {}
-                
-                # Ensure all expected fields exist
-                for field in expected_fields:
-                    normalized_product[field] = product.get(field, None)
-                
-                # Clean and normalize product name
-                if normalized_product.get("name"):
-                    normalized_product["name"] = self._clean_text(normalized_product["name"])
-                
-                # Ensure price is a float
-                if normalized_product.get("price"):
-                    if isinstance(normalized_product["price"], str):
-                        normalized_product["price"] = self._extract_price(normalized_product["price"])
-                
-                # Generate a unique ID if missing
-                if not normalized_product.get("id"):
-                    normalized_product["id"] = self._generate_id(normalized_product)
-                
-                # Add timestamp for when this data was collected
-                normalized_product["timestamp"] = datetime.utcnow().isoformat()
-                
-                normalized_products.append(normalized_product)
+            # Ensure all expected fields exist
+            for field in expected_fields:
+                normalized_product[field] = product.get(field, None)
+            
+            # Clean and normalize product name
+            if normalized_product.get("name"):
+                normalized_product["name"] = self._clean_text(normalized_product["name"])
+            
+            # Ensure price is a float
+            if normalized_product.get("price"):
+                if isinstance(normalized_product["price"], str):
+                    normalized_product["price"] = self._extract_price(normalized_product["price"])
+            
+            # Generate a unique ID if missing
+            if not normalized_product.get("id"):
+                normalized_product["id"] = self._generate_id(normalized_product)
             
-            return json.dumps(normalized_products, indent=2)
+            # Add timestamp for when this data was collected
+            normalized_product["timestamp"] = collected_at
+            
+            normalized_products.append(normalized_product)
         
-        except Exception as e:
-            return json.dumps({"error": f"Normalization failed: {str(e)}"})
+        return normalized_products
     
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text data"""
         if not text:
             return ""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        # Remove extra whitespace; split() collapses runs and trims the ends in one C pass
+        text = ' '.join(text.split())
         # Remove special characters that might cause issues
-        text = re.sub(r'[^\w\s\-.,]', '', text)
+        text = _SPECIAL_CHARS_RE.sub('', text)
         return text
     
     def _extract_price(self, price_str: str) -> float:
@@ -69,18 +83,29 @@ class DataNormalizationTool(BaseTool):
             return float(price_str)
         
         # Extract digits and decimal point
-        price_match = re.search(r'(\d+(?:\.\d+)?)', price_str.replace(',', '.'))
+        price_match = _PRICE_RE.search(price_str.replace(',', '.'))
         if price_match:
             return float(price_match.group(1))
         return 0.0
     
     def _generate_id(self, product: Dict[str, Any]) -> str:
         """Generate a unique ID based on product attributes"""
-        import hashlib
         # Create a string from name and other available attributes
         id_base = product.get("name", "") + str(product.get("price", ""))
-        # Create a hash for the ID
-        return hashlib.md5(id_base.encode()).hexdigest()
+        # Create a hash for the ID; it only has to be stable, not cryptographic, and
+        # BLAKE2b is faster than MD5 while keeping the same 32-character hex shape
+        return hashlib.blake2b(id_base.encode(), digest_size=16).hexdigest()
+
+# Converters from a raw value to each schema type name; values of any other type,
+# including non-string types such as {"type": "float"}, are kept as-is
+_SCHEMA_CONVERTERS = {
+    "str": str,
+    "int": lambda value: int(float(value)) if value else 0,
+    "float": lambda value: float(value) if value else 0.0,
+    "bool": bool,
+    "list": lambda value: list(value) if isinstance(value, (list, tuple)) else [value],
+    "dict": lambda value: dict(value) if isinstance(value, dict) else {},
+}
 
 class SchemaDetectionInput(BaseModel):
     raw_data: str = Field(..., description="JSON string containing raw product data")
@@ -94,19 +119,25 @@ class SchemaDetectionTool(BaseTool):
     def _run(self, raw_data: str, target_schema: Optional[str] = None) -> str:
         try:
             # Parse input data
-            products = json.loads(raw_data)
+            products = loads(raw_data)
             
             # If target schema is provided, use it
             if target_schema:
-                schema = json.loads(target_schema)
+                schema = loads(target_schema)
             else:
                 # Auto-detect schema from data
                 schema = self._detect_schema(products)
             
-            # Map data to the schema
+            # Map data to the schema; it is the same for every product, so its
+            # converters are looked up once. Only string type names are looked
+            # up, so an unusual schema type cannot abort the whole mapping
+            field_converters = [
+                (field, _SCHEMA_CONVERTERS.get(type_name) if isinstance(type_name, str) else None)
+                for field, type_name in schema.items()
+            ]
             mapped_products = []
             for product in products:
-                mapped_product = self._map_to_schema(product, schema)
+                mapped_product = self._map_to_schema(product, field_converters)
                 if mapped_product:  # Only add if mapping was successful
                     mapped_products.append(mapped_product)
             
@@ -116,10 +147,10 @@ class SchemaDetectionTool(BaseTool):
                 "products_count": len(mapped_products)
             }
             
-            return json.dumps(result, indent=2)
+            return dumps(result)
             
         except Exception as e:
-            return json.dumps({"error": f"Schema detection failed: {str(e)}"})
+            return dumps({"error": f"Schema detection failed: {str(e)}"})
     
     def _detect_schema(self, products: List[Dict[str, Any]]) -> Dict[str, str]:
         """Automatically detect schema from the data"""
@@ -133,37 +164,32 @@ class SchemaDetectionTool(BaseTool):
         
         # Update with fields from other products
         for product in products[1:]:
+            # Products with no new fields are skipped with a single key-view subset
+            # test, so uniform data never reaches the per-field loop
+            if product.keys() <= schema.keys():
+                continue
             for key, value in product.items():
                 if key not in schema:
                     schema[key] = type(value).__name__
         
         return schema
     
-    def _map_to_schema(self, product: Dict[str, Any], schema: Dict[str, str]) -> Dict[str, Any]:
-        """Map a product to the target schema"""
+    def _map_to_schema(
+        self,
+        product: Dict[str, Any],
+        field_converters: List[Tuple[str, Optional[Callable[[Any], Any]]]]
+    ) -> Dict[str, Any]:
+        """Map a product to the target schema, given as (field, converter) pairs"""
         mapped_product = {}
         
-        for field, type_name in schema.items():
+        for field, converter in field_converters:
             # Get value from product or set to None if not present
             value = product.get(field)
             
             if value is not None:
                 # Convert to the expected type if possible
                 try:
-                    if type_name == "str":
-                        mapped_product[field] = str(value)
-                    elif type_name == "int":
-                        mapped_product[field] = int(float(value)) if value else 0
-                    elif type_name == "float":
-                        mapped_product[field] = float(value) if value else 0.0
-                    elif type_name == "bool":
-                        mapped_product[field] = bool(value)
-                    elif type_name == "list":
-                        mapped_product[field] = list(value) if isinstance(value, (list, tuple)) else [value]
-                    elif type_name == "dict":
-                        mapped_product[field] = dict(value) if isinstance(value, dict) else {}
-                    else:
-                        mapped_product[field] = value
+                    mapped_product[field] = converter(value) if converter else value
                 except (ValueError, TypeError):
                     mapped_product[field] = None
             else:
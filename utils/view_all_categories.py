@@ -1,52 +1,76 @@
 import os
-import json
-import glob
+import gzip
+import heapq
+import orjson
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Analysis files are saved as lego_<category>_analysis_<YYYYmmdd>_<HHMMSS>.json[.gz]
+_ANALYSIS_FILE_RE = re.compile(r'^lego_(?P<category>.+)_analysis_(?P<timestamp>[^_]+_[^_]+)\.json(?:\.gz)?$')
+
+def _load_analysis_file(file_path):
+    """Read and decode one analysis file, compressed or not"""
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rb') as f:
+        return orjson.loads(f.read())
+
 def load_latest_analyses():
     """Load the latest analysis file for each category"""
     categories = {}
+    latest_files = {}  # category -> (timestamp, file path) of its newest file
     
-    # Find all analysis files
-    analysis_files = glob.glob('data/lego_*_analysis_*.json')
+    # Find all analysis files, compressed or not
+    try:
+        entries = list(os.scandir('data'))
+    except FileNotFoundError:
+        return categories
     
-    for file_path in analysis_files:
-        # Extract category name from filename
-        filename = os.path.basename(file_path)
-        parts = filename.split('_')
+    for entry in entries:
+        # Extract category name and timestamp from filename
+        match = _ANALYSIS_FILE_RE.match(entry.name)
         
         # Skip if filename doesn't match expected pattern
-        if len(parts) < 4:
+        if not match:
             continue
-            
-        # Extract category (could be multiple words)
-        category_parts = []
-        for part in parts[1:-2]:  # Skip 'lego_' prefix and '_analysis_timestamp.json' suffix
-            if not part.startswith('20'):  # Not part of the timestamp
-                category_parts.append(part)
         
-        category = ' '.join(category_parts).capitalize()
+        file_path = entry.path
+        category = match['category'].replace('_', ' ').capitalize()
         
-        # Extract timestamp from filename
-        timestamp_str = parts[-1].replace('.json', '')
         try:
-            timestamp = datetime.strptime(f"{parts[-2]}_{timestamp_str}", "%Y%m%d_%H%M%S")
+            timestamp = datetime.strptime(match['timestamp'], "%Y%m%d_%H%M%S")
         except ValueError:
-            # If timestamp parsing fails, use file modification time
-            timestamp = datetime.fromtimestamp(os.path.getmtime(file_path))
+            # If timestamp parsing fails, use file modification time; the DirEntry
+            # caches its stat result, so the file is not stat'ed again
+            timestamp = datetime.fromtimestamp(entry.stat().st_mtime)
         
         # If this category hasn't been seen yet or this file is newer
-        if category not in categories or timestamp > categories[category]['timestamp']:
-            with open(file_path, 'r') as f:
-                try:
-                    data = json.load(f)
-                    categories[category] = {
-                        'data': data,
-                        'timestamp': timestamp,
-                        'file_path': file_path
-                    }
-                except json.JSONDecodeError:
-                    print(f"Error parsing {file_path}")
+        if category not in latest_files or timestamp > latest_files[category][0]:
+            latest_files[category] = (timestamp, file_path)
+    
+    if not latest_files:
+        return categories
+    
+    # Only the newest file of each category is read. Reading and decompressing
+    # release the GIL, so the files are loaded side by side
+    with ThreadPoolExecutor(max_workers=min(8, len(latest_files))) as executor:
+        futures = {
+            category: executor.submit(_load_analysis_file, file_path)
+            for category, (timestamp, file_path) in latest_files.items()
+        }
+    
+    for category, future in futures.items():
+        timestamp, file_path = latest_files[category]
+        try:
+            categories[category] = {
+                'data': future.result(),
+                'timestamp': timestamp,
+                'file_path': file_path
+            }
+        except (orjson.JSONDecodeError, OSError, EOFError):
+            # Corrupt JSON, a truncated or bad gzip file, or an unreadable file
+            print(f"Error parsing {file_path}")
     
     return categories
 
@@ -58,10 +82,12 @@ def generate_summary_report():
         print("No analysis data found. Please run the monitoring process first.")
         return
     
-    print("\n========== LEGO PRICE MONITORING SUMMARY ==========")
-    print(f"Report generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Categories monitored: {len(categories)}")
-    print("=" * 50)
+    # Build the whole report first and write it in one go
+    out = []
+    out.append("\n========== LEGO PRICE MONITORING SUMMARY ==========")
+    out.append(f"Report generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    out.append(f"Categories monitored: {len(categories)}")
+    out.append("=" * 50)
     
     total_price_changes = 0
     total_new_products = 0
@@ -75,11 +101,11 @@ def generate_summary_report():
         new_products = data.get('new_products', [])
         removed_products = data.get('removed_products', [])
         
-        print(f"\n>> CATEGORY: {category}")
-        print(f"   Last updated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"   Price changes: {len(price_changes)}")
-        print(f"   New products: {len(new_products)}")
-        print(f"   Removed products: {len(removed_products)}")
+        out.append(f"\n>> CATEGORY: {category}")
+        out.append(f"   Last updated: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
+        out.append(f"   Price changes: {len(price_changes)}")
+        out.append(f"   New products: {len(new_products)}")
+        out.append(f"   Removed products: {len(removed_products)}")
         
         total_price_changes += len(price_changes)
         total_new_products += len(new_products)
@@ -87,11 +113,10 @@ def generate_summary_report():
         
         # Show some details of the most significant changes
         if price_changes:
-            # Sort by absolute percentage change
-            sorted_changes = sorted(price_changes, key=lambda x: abs(x.get('percent_change', 0)), reverse=True)
-            top_changes = sorted_changes[:3]  # Show top 3
+            # Top 3 by absolute percentage change, without sorting the whole list
+            top_changes = heapq.nlargest(3, price_changes, key=lambda x: abs(x.get('percent_change', 0)))
             
-            print("\n   Top price changes:")
+            out.append("\n   Top price changes:")
             for change in top_changes:
                 product_name = change.get('product_name', 'Unknown')
                 old_price = change.get('previous_price', 0)
@@ -99,21 +124,23 @@ def generate_summary_report():
                 percent = change.get('percent_change', 0)
                 direction = "↑" if percent > 0 else "↓"
                 
-                print(f"   - {product_name}: {old_price:.2f} → {new_price:.2f} ({direction}{abs(percent):.1f}%)")
+                out.append(f"   - {product_name}: {old_price:.2f} → {new_price:.2f} ({direction}{abs(percent):.1f}%)")
         
         if new_products:
-            print("\n   New products:")
+            out.append("\n   New products:")
             for product in new_products[:3]:  # Show top 3
                 name = product.get('name', 'Unknown')
                 price = product.get('price', 0)
-                print(f"   - {name}: {price:.2f}")
+                out.append(f"   - {name}: {price:.2f}")
+    
+    out.append("\n" + "=" * 50)
+    out.append("OVERALL SUMMARY:")
+    out.append(f"Total price changes: {total_price_changes}")
+    out.append(f"Total new products: {total_new_products}")
+    out.append(f"Total removed products: {total_removed_products}")
+    out.append("=" * 50)
     
-    print("\n" + "=" * 50)
-    print("OVERALL SUMMARY:")
-    print(f"Total price changes: {total_price_changes}")
-    print(f"Total new products: {total_new_products}")
-    print(f"Total removed products: {total_removed_products}")
-    print("=" * 50)
+    sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
     generate_summary_report()
\ No newline at end of file